@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from cachetools import TTLCache
+from pymongo import ASCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "2048"))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+AI_CACHE_MONGO = os.getenv("AI_CACHE_MONGO", "").lower() in ("1", "true", "yes")
+
+def prompt_key(model: str, system_message: str, prompt: str) -> str:
+    """Hash of the whitespace-normalized request so formatting noise still hits"""
+    normalized = "\x1f".join(" ".join(part.split()) for part in (model, system_message, prompt))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+class ResponseCache:
+    """LRU/TTL cache for LLM responses with an optional Mongo tier and single-flight"""
+    
+    def __init__(self, maxsize: int = AI_CACHE_SIZE, ttl: int = AI_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.collection = None
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "memory_hits": 0,
+            "mongo_hits": 0,
+            "coalesced": 0,
+            "misses": 0,
+            "upstream_seconds": 0.0,
+        }
+    
+    async def attach_db(self, db):
+        """Enable the Mongo tier; documents expire through a TTL index on expiresAt"""
+        self.collection = db.ai_cache
+        await self.collection.create_indexes([
+            IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+            IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+        ])
+    
+    async def lookup(self, key: str) -> Optional[str]:
+        """Return a cached value from the memory or Mongo tier without computing it"""
+        if key in self.memory:
+            self.counters["memory_hits"] += 1
+            return self.memory[key]
+        
+        if self.collection is not None:
+            doc = await self.collection.find_one({"key": key, "expiresAt": {"$gt": datetime.utcnow()}})
+            if doc:
+                self.counters["mongo_hits"] += 1
+                self.memory[key] = doc["value"]
+                return doc["value"]
+        return None
+    
+    async def store(self, key: str, value: str):
+        self.memory[key] = value
+        if self.collection is not None:
+            try:
+                await self.collection.update_one(
+                    {"key": key},
+                    {"$set": {"value": value, "expiresAt": datetime.utcnow() + timedelta(seconds=self.ttl)}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"AI cache write failed: {e}")
+    
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        if key in self.memory:
+            self.counters["memory_hits"] += 1
+            return self.memory[key]
+        
+        # The compute runs in its own task, so a caller that goes away (say, a client
+        # disconnect) cancels only its own wait, never the others sharing the result
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._load_or_compute(key, compute))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+    
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # Waiters re-raise it; retrieve it so a task nobody awaits any more does not warn
+        if not task.cancelled():
+            task.exception()
+    
+    async def _load_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        value = await self.lookup(key)
+        if value is not None:
+            return value
+        
+        self.counters["misses"] += 1
+        start = time.perf_counter()
+        try:
+            value = await compute()
+        finally:
+            self.counters["upstream_seconds"] += time.perf_counter() - start
+        
+        await self.store(key, value)
+        return value
+    
+    def stats(self) -> Dict[str, Optional[float]]:
+        hits = self.counters["memory_hits"] + self.counters["mongo_hits"] + self.counters["coalesced"]
+        total = hits + self.counters["misses"]
+        misses = self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self.memory),
+            "hitRate": hits / total if total else None,
+            "avgUpstreamSeconds": self.counters["upstream_seconds"] / misses if misses else None,
+        }
@@ -1,22 +1,44 @@
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import logging
 import os
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
+from ai_cache import ResponseCache, prompt_key
+from llm_backends import create_backend
+from llm_guard import LLMGuard
+from metrics import ai_timer
+from skill_suggestions import skill_associations
+
+logger = logging.getLogger(__name__)
 
 EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
+LLM_PROVIDER = "openai"
+LLM_MODEL = "gpt-4o-mini"
+CHAT_ASSISTANT_SYSTEM_MESSAGE = "You are a helpful AI assistant for SkillSwap, a skill exchange platform. Help users with skill matching, conversation starters, and platform guidance. Be friendly and concise."
+CHAT_ASSISTANT_FALLBACK = "I'm having trouble connecting right now. Please try again later."
 
 class AIService:
     def __init__(self):
         self.api_key = EMERGENT_LLM_KEY
+        self.backend = create_backend(self.api_key)
+        self.guard = LLMGuard()
+        self.cache = ResponseCache()
+    
+    async def _complete(self, session_id: str, system_message: str, prompt: str) -> str:
+        """Send one prompt to the LLM, answering identical requests from the cache"""
+        model = f"{LLM_PROVIDER}/{LLM_MODEL}"
+        
+        async def call_llm() -> str:
+            return await self.guard.call(
+                model,
+                lambda: self.backend.complete(LLM_PROVIDER, LLM_MODEL, session_id, system_message, prompt)
+            )
+        
+        key = prompt_key(model, system_message, prompt)
+        with ai_timer(session_id):
+            return await self.cache.get_or_compute(key, call_llm)
     
     async def get_skill_matches(self, user_skills_to_teach: List[str], user_skills_to_learn: List[str], all_users: List[Dict]) -> List[Dict]:
         """Use AI to find best skill exchange matches"""
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="skill-matching",
-                system_message="You are a skill matching expert. Analyze user skills and recommend the best matches for skill exchanges."
-            ).with_model("openai", "gpt-4o-mini")
-            
             prompt = f"""
             User wants to teach: {', '.join(user_skills_to_teach)}
             User wants to learn: {', '.join(user_skills_to_learn)}
@@ -27,8 +49,11 @@ class AIService:
             Recommend the top 3 best matches. Return only the user IDs in this format: id1,id2,id3
             """
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await self._complete(
+                "skill-matching",
+                "You are a skill matching expert. Analyze user skills and recommend the best matches for skill exchanges.",
+                prompt
+            )
             
             # Parse response to get user IDs
             recommended_ids = response.strip().split(',')
@@ -40,13 +65,9 @@ class AIService:
     
     async def enhance_profile(self, bio: str, skills_to_teach: List[str], skills_to_learn: List[str]) -> Dict[str, any]:
         """Use AI to enhance user profile"""
+        # From the in-memory co-occurrence model, so they are there even if the LLM call fails
+        suggested_skills = skill_associations.suggest(skills_to_teach + skills_to_learn)
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="profile-enhancement",
-                system_message="You are a profile optimization expert. Help users create compelling profiles for skill exchange platforms."
-            ).with_model("openai", "gpt-4o-mini")
-            
             prompt = f"""
             Current bio: {bio}
             Skills to teach: {', '.join(skills_to_teach)}
@@ -56,36 +77,62 @@ class AIService:
             Return only the enhanced bio text.
             """
             
-            user_message = UserMessage(text=prompt)
-            enhanced_bio = await chat.send_message(user_message)
+            enhanced_bio = await self._complete(
+                "profile-enhancement",
+                "You are a profile optimization expert. Help users create compelling profiles for skill exchange platforms.",
+                prompt
+            )
             
             return {
                 "enhancedBio": enhanced_bio.strip(),
-                "suggestedSkills": []
+                "suggestedSkills": suggested_skills
             }
         except Exception as e:
             print(f"AI enhancement error: {e}")
             return {
                 "enhancedBio": bio,
-                "suggestedSkills": []
+                "suggestedSkills": suggested_skills
             }
     
     async def chat_assistant(self, message: str, context: str = "") -> str:
         """AI chat assistant for user help"""
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="chat-assistant",
-                system_message="You are a helpful AI assistant for SkillSwap, a skill exchange platform. Help users with skill matching, conversation starters, and platform guidance. Be friendly and concise."
-            ).with_model("openai", "gpt-4o-mini")
-            
-            user_message = UserMessage(text=message)
-            response = await chat.send_message(user_message)
+            response = await self._complete(
+                "chat-assistant",
+                CHAT_ASSISTANT_SYSTEM_MESSAGE,
+                message
+            )
             
             return response.strip()
         except Exception as e:
             print(f"AI chat error: {e}")
-            return "I'm having trouble connecting right now. Please try again later."
+            return CHAT_ASSISTANT_FALLBACK
+    
+    async def stream_chat_assistant(self, message: str) -> AsyncIterator[str]:
+        """Stream the chat assistant reply as it is generated"""
+        model = f"{LLM_PROVIDER}/{LLM_MODEL}"
+        key = prompt_key(model, CHAT_ASSISTANT_SYSTEM_MESSAGE, message)
+        cached = await self.cache.lookup(key)
+        if cached is not None:
+            yield cached.strip()
+            return
+        
+        chunks = []
+        try:
+            with ai_timer("chat-assistant-stream"):
+                async for chunk in self.guard.stream(
+                    model,
+                    lambda: self.backend.stream(LLM_PROVIDER, LLM_MODEL, "chat-assistant", CHAT_ASSISTANT_SYSTEM_MESSAGE, message)
+                ):
+                    chunks.append(chunk)
+                    yield chunk
+        except Exception as e:
+            logger.warning(f"AI chat stream error: {e}")
+            if not chunks:
+                yield CHAT_ASSISTANT_FALLBACK
+            return
+        
+        await self.cache.store(key, "".join(chunks))
     
     def _format_users_for_ai(self, users: List[Dict]) -> str:
         """Format users data for AI processing"""
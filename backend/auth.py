@@ -1,24 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from cachetools import LRUCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hashlib
 import os
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hashes_in_flight = 0
 security = HTTPBearer()
 
+# Verified claims keyed by token hash; entries are only served until the token's exp
+_token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def _run_hash(fn, *args):
+    """Run a bcrypt call on the hashing pool, counted from submission until it returns"""
+    global _hashes_in_flight
+    _hashes_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hashes_in_flight -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash(pwd_context.hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop; also returns a new hash when the stored one uses old settings"""
+    return await _run_hash(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def hash_queue_depth() -> int:
+    """Password hashes and checks waiting for a free bcrypt worker"""
+    return max(0, _hashes_in_flight - PASSWORD_HASH_WORKERS)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -30,8 +64,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 def decode_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        _token_cache.pop(key, None)
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if "exp" in payload:
+            _token_cache[key] = payload
         return payload
     except JWTError:
         raise HTTPException(
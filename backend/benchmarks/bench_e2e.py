@@ -0,0 +1,367 @@
+"""End-to-end load test: boot socket_app in-process and drive a realistic request mix.
+
+Mongo is mongomock-motor (in memory) unless --mongo-url is given, and the LLM is
+the stub backend, so absolute numbers describe the app plus its stand-ins rather
+than production. The phases are login storm, search, inbox, a Socket.IO chat burst,
+AI calls and finally a weighted mix of all of them. Per-endpoint p50/p95/p99 and
+throughput are written as JSON; --baseline compares p95s with an earlier run and
+exits non-zero on regressions. The in-memory mode needs `pip install mongomock-motor`.
+
+Usage: python benchmarks/bench_e2e.py [--users 200] [--concurrency 20] [--requests 200]
+                                      [--sockets 40] [--burst 5] [--socket-send] [--output results.json]
+                                      [--baseline previous.json] [--tolerance 0.25]
+                                      [--mongo-url mongodb://...]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+import socketio  # noqa: E402
+import uvicorn  # noqa: E402
+
+PASSWORD = "password123"
+SKILLS: List[str] = []  # seed_data's catalogue, bound once the app modules are imported
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, round(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+class Recorder:
+    """Latency samples and error counts per (phase, endpoint)"""
+    
+    def __init__(self):
+        self.samples: Dict[tuple, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.windows: Dict[tuple, List[float]] = {}
+        self.phase = "setup"
+    
+    def record(self, endpoint: str, started: float, ok: bool = True):
+        finished = time.perf_counter()
+        key = (self.phase, endpoint)
+        self.samples[key].append(finished - started)
+        if not ok:
+            self.errors[key] += 1
+        window = self.windows.setdefault(key, [started, finished])
+        window[0], window[1] = min(window[0], started), max(window[1], finished)
+    
+    def fail(self, endpoint: str, count: int = 1):
+        self.errors[(self.phase, endpoint)] += count
+    
+    def report(self) -> Dict[str, Dict[str, dict]]:
+        phases: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        for (phase, endpoint) in sorted(set(self.samples) | set(self.errors)):
+            ordered = sorted(self.samples.get((phase, endpoint), []))
+            start, end = self.windows.get((phase, endpoint), (0.0, 0.0))
+            phases[phase][endpoint] = {
+                "count": len(ordered),
+                "errors": self.errors[(phase, endpoint)],
+                "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+                "throughput_rps": round(len(ordered) / (end - start), 1) if end > start else 0.0,
+            }
+        return phases
+
+async def run_jobs(jobs: Iterable[Callable], concurrency: int):
+    """Run job factories with at most `concurrency` in flight"""
+    pending = iter(jobs)
+    
+    async def worker():
+        for job in pending:
+            await job()
+    
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+class LoadTest:
+    def __init__(self, args, base_url: str, recorder: Recorder):
+        self.args = args
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = random.Random(args.seed)
+        self.http = httpx.AsyncClient(
+            base_url=base_url, timeout=30,
+            limits=httpx.Limits(max_connections=args.concurrency * 2)
+        )
+        self.sessions: List[dict] = []
+    
+    async def call(self, endpoint: str, method: str, url: str, token: str = None, **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(endpoint, started, ok=False)
+            return None
+        self.recorder.record(endpoint, started, ok=response.status_code < 400)
+        return response if response.status_code < 400 else None
+    
+    def session(self) -> dict:
+        return self.rng.choice(self.sessions)
+    
+    # ---- operations ----
+    
+    async def login(self, index: int):
+        response = await self.call(
+            "POST /api/auth/login", "POST", "/api/auth/login",
+            json={"email": f"user{index}@example.com", "password": PASSWORD}
+        )
+        if response:
+            body = response.json()
+            self.sessions.append({"token": body["token"], "user": body["user"]})
+    
+    async def search(self):
+        skill = self.rng.choice(SKILLS)
+        kind = self.rng.random()
+        if kind < 0.5:
+            await self.call("GET /api/users?search", "GET", "/api/users",
+                            self.session()["token"], params={"search": skill.split()[0][:4].lower()})
+        elif kind < 0.8:
+            await self.call("GET /api/users?skill", "GET", "/api/users",
+                            self.session()["token"], params={"skill": skill})
+        else:
+            await self.call("GET /api/users/autocomplete", "GET", "/api/users/autocomplete",
+                            self.session()["token"], params={"q": skill[:2].lower()})
+    
+    async def inbox(self):
+        token = self.session()["token"]
+        response = await self.call("GET /api/messages/conversations", "GET", "/api/messages/conversations", token)
+        conversations = response.json()["conversations"] if response else []
+        if conversations:
+            conversation = self.rng.choice(conversations)
+            await self.call("GET /api/messages/{id}", "GET", f"/api/messages/{conversation['id']}", token)
+    
+    async def send(self, sender: dict, receiver: dict, text: str):
+        await self.call("POST /api/messages/send", "POST", "/api/messages/send", sender["token"],
+                        json={"receiverId": receiver["user"]["id"], "message": text})
+    
+    async def ai(self):
+        current = self.session()
+        kind = self.rng.random()
+        if kind < 0.5:
+            await self.call("POST /api/ai/chat-assistant", "POST", "/api/ai/chat-assistant", current["token"],
+                            json={"message": f"How do I start teaching {self.rng.randrange(1000)}?"})
+        elif kind < 0.8:
+            await self.call("POST /api/ai/match-recommendations", "POST", "/api/ai/match-recommendations",
+                            current["token"], json={"userId": current["user"]["id"]})
+        else:
+            user = current["user"]
+            await self.call("POST /api/ai/enhance-profile", "POST", "/api/ai/enhance-profile", current["token"],
+                            json={"bio": user.get("bio", ""), "skillsToTeach": user.get("skillsToTeach", []),
+                                  "skillsToLearn": user.get("skillsToLearn", [])})
+    
+    # ---- phases ----
+    
+    async def phase(self, name: str, jobs: Iterable[Callable], concurrency: int = None):
+        self.recorder.phase = name
+        started = time.perf_counter()
+        await run_jobs(jobs, concurrency or self.args.concurrency)
+        print(f"✓ {name} finished in {time.perf_counter() - started:.2f}s")
+    
+    async def chat_burst(self):
+        """Connected Socket.IO clients each send a burst to a neighbour; delivery is timed end to end"""
+        self.recorder.phase = "chat_burst"
+        started_at = time.perf_counter()
+        participants = self.sessions[:self.args.sockets]
+        in_flight: Dict[str, float] = {}
+        clients: Dict[str, socketio.AsyncClient] = {}
+    
+        def on_new_message(data):
+            started = in_flight.pop(data.get("message"), None)
+            if started is not None:
+                self.recorder.record("socket new_message delivery", started)
+    
+        async def connect(session: dict):
+            client = socketio.AsyncClient(reconnection=False)
+            client.on("new_message", on_new_message)
+            started = time.perf_counter()
+            try:
+                await client.connect(self.base_url, auth={"token": session["token"]}, transports=["websocket"])
+                self.recorder.record("socket connect", started)
+                clients[session["user"]["id"]] = client
+            except socketio.exceptions.ConnectionError:
+                self.recorder.record("socket connect", started, ok=False)
+    
+        await run_jobs([lambda s=s: connect(s) for s in participants], self.args.concurrency)
+    
+        async def burst(i: int, n: int):
+            sender, receiver = participants[i], participants[(i + 1) % len(participants)]
+            text = f"burst {n} {uuid.uuid4()}"
+            in_flight[text] = time.perf_counter()
+            client = clients.get(sender["user"]["id"])
+            if self.args.socket_send and client:
+                started = time.perf_counter()
+                try:
+                    ack = await client.call("send_message", {"receiverId": receiver["user"]["id"], "message": text})
+                except socketio.exceptions.TimeoutError:
+                    ack = {}
+                self.recorder.record("socket send_message ack", started, ok="id" in ack)
+            else:
+                await self.send(sender, receiver, text)
+    
+        await run_jobs(
+            [lambda i=i, n=n: burst(i, n) for n in range(self.args.burst) for i in range(len(participants))],
+            self.args.concurrency
+        )
+        deadline = time.perf_counter() + 10
+        while in_flight and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        if in_flight:
+            self.recorder.fail("socket new_message delivery", len(in_flight))
+    
+        await asyncio.gather(*(client.disconnect() for client in clients.values()))
+        print(f"✓ chat_burst finished in {time.perf_counter() - started_at:.2f}s")
+    
+    async def run(self):
+        args = self.args
+        await self.phase("login_storm", [lambda i=i: self.login(i) for i in range(min(args.logins, args.users))])
+        if not self.sessions:
+            raise RuntimeError("no successful logins; is the dataset seeded?")
+        await self.phase("search", [self.search] * args.requests)
+        await self.phase("inbox", [self.inbox] * args.requests)
+        await self.chat_burst()
+        await self.phase("ai", [self.ai] * args.ai_requests)
+    
+        async def chat():
+            sender = self.session()
+            await self.send(sender, self.session(), f"mixed {uuid.uuid4()}")
+    
+        mix = [(self.search, 40), (self.inbox, 35), (chat, 15), (self.ai, 10)]
+        operations, weights = zip(*mix)
+        await self.phase("mixed", self.rng.choices(operations, weights, k=args.requests))
+        await self.http.aclose()
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """p95 and error regressions relative to a previous report"""
+    regressions = []
+    for phase, endpoints in baseline.get("phases", {}).items():
+        for endpoint, before in endpoints.items():
+            after = report["phases"].get(phase, {}).get(endpoint)
+            if not after:
+                continue
+            if before["p95_ms"] >= 1 and after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{phase} {endpoint}: p95 {before['p95_ms']}ms -> {after['p95_ms']}ms")
+            if after["errors"] > before["errors"]:
+                regressions.append(f"{phase} {endpoint}: errors {before['errors']} -> {after['errors']}")
+    return regressions
+
+async def run(args) -> dict:
+    # Configure the app before it is imported
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["LLM_STUB_LATENCY"] = str(args.llm_latency)
+    os.environ["LLM_STUB_JITTER"] = str(args.llm_latency / 4)
+    os.environ.setdefault("MONGO_URL", args.mongo_url or "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "skillswap_bench")
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    
+    import database
+    if args.mongo_url:
+        database.mongo.connect(args.mongo_url)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        database.mongo.client = AsyncMongoMockClient()
+    
+    import seed_data
+    import server
+    global SKILLS
+    SKILLS = seed_data.SKILLS
+    for name in ("socketio.server", "engineio.server", "httpx", "server"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    # Every virtual user shares one IP, and mongomock alone lags the loop
+    server.rate_limiter.enabled = args.rate_limit
+    server.load_shedder.enabled = args.rate_limit
+    
+    db = database.mongo.db
+    for name in ("users", "conversations", "messages", "inboxes", "match_recommendations"):
+        await db[name].drop()
+    started = time.perf_counter()
+    counts = await seed_data.seed_synthetic(
+        db, args.users, args.conversations_per_user, args.messages_per_conversation,
+        args.seed, batch_size=max(1, args.users // 4), workers=0
+    )
+    print(f"✓ Seeded {counts} in {time.perf_counter() - started:.1f}s")
+    
+    port = free_port()
+    app_server = uvicorn.Server(uvicorn.Config(
+        server.socket_app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"
+    ))
+    serving = asyncio.create_task(app_server.serve())
+    while not app_server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+    
+    recorder = Recorder()
+    try:
+        await LoadTest(args, f"http://127.0.0.1:{port}", recorder).run()
+    finally:
+        app_server.should_exit = True
+        await serving
+    
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "dataset": counts,
+        "phases": recorder.report(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the FastAPI + Socket.IO app")
+    parser.add_argument("--users", type=int, default=200, help="synthetic users to seed")
+    parser.add_argument("--conversations-per-user", type=int, default=2)
+    parser.add_argument("--messages-per-conversation", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=200, help="users logging in during the storm")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users per phase")
+    parser.add_argument("--requests", type=int, default=200, help="operations in the search, inbox and mixed phases")
+    parser.add_argument("--ai-requests", type=int, default=50)
+    parser.add_argument("--sockets", type=int, default=40, help="Socket.IO clients in the chat burst")
+    parser.add_argument("--burst", type=int, default=5, help="messages each socket client sends")
+    parser.add_argument("--socket-send", action="store_true", help="send burst messages with the send_message event instead of REST")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub LLM latency in seconds")
+    parser.add_argument("--bcrypt-rounds", type=int, default=0, help="override BCRYPT_ROUNDS (0 keeps the default)")
+    parser.add_argument("--rate-limit", action="store_true", help="keep rate limiting and load shedding on")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", default=None, help="run against a real MongoDB instead of mongomock")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="previous JSON report to compare p95s against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth before failing")
+    args = parser.parse_args()
+    
+    report = asyncio.run(run(args))
+    rendered = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(rendered)
+        print(f"✓ Report written to {args.output}")
+    else:
+        print(rendered)
+    
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
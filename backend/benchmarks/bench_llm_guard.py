@@ -0,0 +1,52 @@
+"""Load-test AIService against the stub LLM backend with injected latency and failures.
+
+Usage: python benchmarks/bench_llm_guard.py [--requests 500] [--latency 0.2] [--failure-rate 0.3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["LLM_BACKEND"] = "stub"
+
+from ai_service import AIService  # noqa: E402
+from llm_backends import StubBackend  # noqa: E402
+from llm_guard import LLMGuard  # noqa: E402
+
+async def run(args):
+    service = AIService()
+    service.backend = StubBackend(latency=args.latency, jitter=args.latency / 4, failure_rate=args.failure_rate, seed=1)
+    service.guard = LLMGuard(max_concurrency=args.concurrency, timeout=args.timeout, deadline=args.timeout * 3)
+    
+    # Distinct prompts so every request misses the response cache
+    async def one(i):
+        start = time.perf_counter()
+        await service.chat_assistant(f"question {i}")
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*[one(i) for i in range(args.requests)]))
+    elapsed = time.perf_counter() - start
+    
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    
+    print(f"requests={args.requests} elapsed={elapsed:.2f}s upstream_calls={service.backend.calls}")
+    print(f"p50={pct(50):.0f}ms p95={pct(95):.0f}ms p99={pct(99):.0f}ms mean={statistics.mean(latencies) * 1000:.0f}ms")
+    print(f"guard={service.guard.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
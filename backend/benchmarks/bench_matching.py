@@ -0,0 +1,77 @@
+"""Compare vectorized NumPy match scoring with a pure-Python loop.
+
+Usage: python benchmarks/bench_matching.py [--sizes 10000 100000 1000000] [--all-pairs 10000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from matching import SkillMatchIndex  # noqa: E402
+from vector_matching import SkillMatrix  # noqa: E402
+
+SKILLS = [f"skill-{i}" for i in range(300)]
+LOCATIONS = ["New York, NY", "Austin, TX", "Seattle, WA", "Chicago, IL", ""]
+
+def synthetic_users(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    # Zipf-like popularity so a few skills are very common
+    weights = [1.0 / (rank + 1) for rank in range(len(SKILLS))]
+    for i in range(n):
+        yield {
+            "id": f"user-{i}",
+            "skillsToTeach": rng.choices(SKILLS, weights, k=rng.randint(1, 5)),
+            "skillsToLearn": rng.choices(SKILLS, weights, k=rng.randint(1, 5)),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "completedExchanges": rng.randint(0, 50),
+            "location": rng.choice(LOCATIONS),
+        }
+
+def python_loop(index: SkillMatchIndex, user_id: str, k: int):
+    user = index.profiles[user_id]
+    scored = [
+        (cid, index.score(user, profile))
+        for cid, profile in index.profiles.items() if cid != user_id
+    ]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:k]
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--all-pairs", type=int, default=10_000, help="user count for the all-pairs run")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    
+    print(f"{'users':>10} {'python (ms)':>12} {'numpy (ms)':>12} {'speedup':>8}")
+    for n in args.sizes:
+        users = list(synthetic_users(n))
+        index = SkillMatchIndex()
+        index.load(users)
+        matrix = SkillMatrix(users, weights=index)
+        
+        python_ms = timed(lambda: python_loop(index, "user-0", args.k), repeat=1 if n >= 1_000_000 else 3)
+        numpy_ms = timed(lambda: matrix.top_k_one("user-0", args.k))
+        print(f"{n:>10} {python_ms:>12.1f} {numpy_ms:>12.1f} {python_ms / numpy_ms:>7.1f}x")
+    
+    if args.all_pairs:
+        matrix = SkillMatrix(synthetic_users(args.all_pairs))
+        start = time.perf_counter()
+        for _ in matrix.top_k_all(args.k):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"all-pairs top-{args.k} for {args.all_pairs} users: {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
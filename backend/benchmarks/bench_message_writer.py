@@ -0,0 +1,122 @@
+"""Throughput of message persistence: per-message writes vs batched write-behind.
+
+Without --mongo-url, writes go to a simulated database: each command holds a
+pooled connection for one round trip, then spends per-command and per-document
+server time on a fixed number of cores. The numbers show the effect of fewer
+commands, not Mongo's real write cost; use --mongo-url for that.
+
+Usage: python benchmarks/bench_message_writer.py [--messages 20000] [--senders 1000] [--rtt-ms 1]
+                                                 [--pool 100] [--windows 1 2 5 10 20]
+                                                 [--mongo-url mongodb://...]
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from message_writer import MessageWriter  # noqa: E402
+
+class SimulatedCollection:
+    """A command holds a pooled connection for one round trip, then server time
+    (per-command overhead plus per-document cost) on a fixed number of cores"""
+    
+    def __init__(self, args, pool: asyncio.Semaphore, cores: asyncio.Semaphore):
+        self.rtt = args.rtt_ms / 1000
+        self.overhead = args.command_us / 1_000_000
+        self.per_doc = args.per_doc_us / 1_000_000
+        self.pool = pool
+        self.cores = cores
+    
+    async def _command(self, documents: int):
+        async with self.pool:
+            await asyncio.sleep(self.rtt)
+            async with self.cores:
+                await asyncio.sleep(self.overhead + self.per_doc * documents)
+    
+    async def insert_one(self, document):
+        await self._command(1)
+    
+    async def insert_many(self, documents, ordered=True):
+        await self._command(len(documents))
+    
+    async def update_one(self, query, update):
+        await self._command(1)
+    
+    async def bulk_write(self, operations, ordered=True):
+        await self._command(len(operations))
+
+class SimulatedDatabase:
+    def __init__(self, args):
+        pool = asyncio.Semaphore(args.pool)
+        cores = asyncio.Semaphore(args.cores)
+        self.messages = SimulatedCollection(args, pool, cores)
+        self.conversations = SimulatedCollection(args, pool, cores)
+
+def make_message(conversation_id: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "conversationId": conversation_id,
+        "senderId": "sender",
+        "receiverId": "receiver",
+        "message": "hello",
+        "read": False,
+        "createdAt": datetime.utcnow(),
+    }
+
+async def run(db, window_ms, args):
+    conversations = [str(uuid.uuid4()) for _ in range(args.senders)]
+    per_sender = args.messages // args.senders
+    writer = None
+    if window_ms is not None:
+        writer = MessageWriter(batch_window=window_ms / 1000)
+        writer.start(db)
+    
+    async def sender(conversation_id):
+        for _ in range(per_sender):
+            message = make_message(conversation_id)
+            update = {"lastMessage": message["message"], "lastMessageTime": message["createdAt"]}
+            if writer is None:
+                await db.messages.insert_one(message)
+                await db.conversations.update_one({"id": conversation_id}, {"$set": update})
+            else:
+                await (await writer.submit(message, update))
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[sender(c) for c in conversations])
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        await writer.stop()
+    
+    label = "direct" if window_ms is None else f"{window_ms:g}ms"
+    batches = f"  batches={writer.counters['batches']}" if writer else ""
+    print(f"{label:>8}: {per_sender * args.senders / elapsed:10.0f} msg/s{batches}")
+
+async def main(args):
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        db = client["skillswap_bench"]
+    else:
+        db = SimulatedDatabase(args)
+    
+    await run(db, None, args)
+    for window in args.windows:
+        await run(db, window, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--senders", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    parser.add_argument("--command-us", type=float, default=200.0, help="simulated server time per command")
+    parser.add_argument("--per-doc-us", type=float, default=10.0, help="simulated server time per document")
+    parser.add_argument("--cores", type=int, default=4, help="simulated server cores")
+    parser.add_argument("--pool", type=int, default=100, help="simulated connection pool size")
+    parser.add_argument("--windows", type=float, nargs="+", default=[1, 2, 5, 10, 20])
+    parser.add_argument("--mongo-url", default=None)
+    asyncio.run(main(parser.parse_args()))
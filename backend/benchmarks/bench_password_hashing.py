@@ -0,0 +1,67 @@
+"""Measure login latency and event-loop stalls with inline vs pooled bcrypt.
+
+A ticker task stands in for concurrent chat traffic: it sleeps 5ms in a loop and
+records how late it wakes up, which is the delay every other request would see.
+
+Usage: BCRYPT_ROUNDS=12 python benchmarks/bench_password_hashing.py [--logins 200] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import auth  # noqa: E402
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - start - 0.005)
+
+async def run(mode, hashed, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    
+    async def login(start):
+        # Timed from arrival so queueing behind other logins is included
+        async with semaphore:
+            if mode == "inline":
+                auth.verify_password("password123", hashed)
+            else:
+                await auth.verify_password_async("password123", hashed)
+        return time.perf_counter() - start
+    
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[login(time.perf_counter()) for _ in range(args.logins)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    
+    print(
+        f"{mode:>7}: {args.logins / elapsed:7.1f} logins/s  "
+        f"login p50={percentile(latencies, 50):7.1f}ms p99={percentile(latencies, 99):7.1f}ms  "
+        f"chat lag p50={percentile(lags, 50):6.1f}ms p99={percentile(lags, 99):6.1f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    
+    # Hash with the configured work factor so verification never triggers a rehash
+    hashed = auth.get_password_hash("password123")
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS} workers={auth.PASSWORD_HASH_WORKERS}")
+    asyncio.run(run("inline", hashed, args))
+    asyncio.run(run("pooled", hashed, args))
+
+if __name__ == "__main__":
+    main()
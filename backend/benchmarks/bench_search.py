@@ -0,0 +1,54 @@
+"""Build the in-memory search index from the seed dataset and time ranked searches.
+
+Each query is timed for its first page and for the page after it, as the /api/users
+cursor would request it; times are the median of --repeat runs.
+
+Usage: python benchmarks/bench_search.py [--sizes 100000 1000000] [--queries photography m "web dev"]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from seed_data import synthetic_user  # noqa: E402
+from search import SEARCH_MAX_CANDIDATES, SearchIndex  # noqa: E402
+
+QUERIES = ["photography", "python", "john", "m", "s", "web dev", "ma s", "data sci"]
+
+def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", nargs="+", default=QUERIES)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-candidates", type=int, default=SEARCH_MAX_CANDIDATES)
+    args = parser.parse_args()
+    
+    for n in args.sizes:
+        users = [synthetic_user(42, i, "") for i in range(n)]
+        index = SearchIndex(max_candidates=args.max_candidates)
+        start = time.perf_counter()
+        index.load(users)
+        print(f"\n{n} users, index built in {time.perf_counter() - start:.1f}s")
+        print(f"{'query':>14} {'page 1 (ms)':>12} {'page 2 (ms)':>12} {'top score':>10}")
+        for query in args.queries:
+            first = index.search(query, limit=args.limit + 1)
+            after = (first[args.limit - 1][1], first[args.limit - 1][0]) if len(first) > args.limit else None
+            page_1 = median_ms(lambda: index.search(query, limit=args.limit + 1), args.repeat)
+            page_2 = median_ms(lambda: index.search(query, limit=args.limit + 1, after=after), args.repeat) if after else 0.0
+            top = first[0][1] if first else 0.0
+            print(f"{query:>14} {page_1:>12.2f} {page_2:>12.2f} {top:>10.1f}")
+
+if __name__ == "__main__":
+    main()
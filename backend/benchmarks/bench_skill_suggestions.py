@@ -0,0 +1,58 @@
+"""Build the skill co-occurrence model at scale and time suggestions.
+
+Compares the NumPy batch builder with a pure-Python Counter over every skill pair,
+then times `suggest` and an incremental `update` against the built model.
+
+Usage: python benchmarks/bench_skill_suggestions.py [--sizes 100000 1000000] [--python-max 100000]
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from itertools import combinations
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_matching import synthetic_users  # noqa: E402
+from skill_suggestions import SkillAssociations, user_skills  # noqa: E402
+
+def python_counts(baskets):
+    skills, pairs = Counter(), Counter()
+    for basket in baskets:
+        skills.update(basket)
+        pairs.update(combinations(sorted(basket), 2))
+    return skills, pairs
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def per_call_us(fn, calls: int) -> float:
+    return timed(lambda: [fn(i) for i in range(calls)]) / calls * 1_000_000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--python-max", type=int, default=100_000, help="largest size to also count in pure Python")
+    parser.add_argument("--calls", type=int, default=10_000)
+    args = parser.parse_args()
+    
+    print(f"{'users':>10} {'python (s)':>11} {'numpy (s)':>10} {'pairs':>8} {'suggest (us)':>13} {'update (us)':>12}")
+    for n in args.sizes:
+        baskets = [user_skills(user) for user in synthetic_users(n)]
+        python_s = timed(lambda: python_counts(baskets)) if n <= args.python_max else float("nan")
+        
+        model = SkillAssociations()
+        numpy_s = timed(lambda: model.build(baskets))
+        
+        suggest_us = per_call_us(lambda i: model.suggest(baskets[i % n]), args.calls)
+        update_us = per_call_us(
+            lambda i: model.update(baskets[i % n], baskets[(i + 1) % n]), args.calls
+        )
+        print(f"{n:>10} {python_s:>11.2f} {numpy_s:>10.2f} {model.stats()['pairs']:>8} "
+              f"{suggest_us:>13.1f} {update_us:>12.1f}")
+
+if __name__ == "__main__":
+    main()
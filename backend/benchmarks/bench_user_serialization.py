@@ -0,0 +1,87 @@
+"""Serialization cost of the /api/users payload: legacy path vs projected fast path.
+
+legacy: full user documents -> user_to_response dict copy -> jsonable_encoder -> json.dumps
+fast:   projected documents -> pre-built TypeAdapter -> pydantic-core to_json
+
+Usage: python benchmarks/bench_user_serialization.py [--sizes 100 1000 10000]
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from serializers import FastJSONResponse, USER_RESPONSE_FIELDS, users_to_response  # noqa: E402
+
+def full_document(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "name": f"User {i}",
+        "email": f"user{i}@example.com",
+        "password": "$2b$12$" + "x" * 53,
+        "avatar": f"https://api.dicebear.com/7.x/avataaars/svg?seed=user{i}",
+        "bio": "Food blogger and photography enthusiast with a passion for culinary arts",
+        "location": "New York, NY",
+        "skillsToTeach": ["Cooking", "Food Photography", "Baking"],
+        "skillsToLearn": ["Web Development", "Video Editing", "Marketing"],
+        "searchTokens": ["user", "cooking", "food", "photography", "baking"],
+        "rating": 4.9,
+        "completedExchanges": 22,
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow(),
+    }
+
+def user_to_response(user: dict) -> dict:
+    # Copy of the field-by-field helper in server.py
+    return {
+        "id": user["id"],
+        "name": user["name"],
+        "email": user["email"],
+        "avatar": user.get("avatar"),
+        "bio": user.get("bio", ""),
+        "location": user.get("location", ""),
+        "skillsToTeach": user.get("skillsToTeach", []),
+        "skillsToLearn": user.get("skillsToLearn", []),
+        "rating": user.get("rating", 0.0),
+        "completedExchanges": user.get("completedExchanges", 0)
+    }
+
+def legacy(docs):
+    content = {"users": [user_to_response(user) for user in docs], "nextCursor": None}
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+def fast(docs):
+    return FastJSONResponse({"users": users_to_response(docs), "nextCursor": None}).body
+
+def timed(fn, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+    
+    print(f"{'users':>7} {'legacy (ms)':>12} {'fast (ms)':>10} {'speedup':>8}")
+    for n in args.sizes:
+        full = [full_document(i) for i in range(n)]
+        projected = [{k: doc[k] for k in USER_RESPONSE_FIELDS if k in doc} for doc in full]
+        assert json.loads(legacy(full)) == json.loads(fast(projected))
+        repeat = max(3, 3000 // n)
+        legacy_ms = timed(legacy, full, repeat)
+        fast_ms = timed(fast, projected, repeat)
+        print(f"{n:>7} {legacy_ms:>12.2f} {fast_ms:>10.2f} {legacy_ms / fast_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
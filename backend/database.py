@@ -0,0 +1,200 @@
+import os
+import time
+import logging
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from metrics import CommandMetrics
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+def _int_env(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def max_pool_size() -> int:
+    """Per-process pool cap; MONGO_TOTAL_POOL_SIZE is split across WEB_CONCURRENCY workers"""
+    explicit = _int_env('MONGO_MAX_POOL_SIZE')
+    if explicit is not None:
+        return explicit
+    total = _int_env('MONGO_TOTAL_POOL_SIZE')
+    if total is not None:
+        workers = max(1, _int_env('WEB_CONCURRENCY') or 1)
+        return max(1, total // workers)
+    return 100
+
+def client_options() -> Dict:
+    """Motor client keyword arguments built from the MONGO_* environment"""
+    options = {
+        "maxPoolSize": max_pool_size(),
+        "minPoolSize": _int_env('MONGO_MIN_POOL_SIZE') or 0,
+        "maxIdleTimeMS": _int_env('MONGO_MAX_IDLE_TIME_MS'),
+        "maxConnecting": _int_env('MONGO_MAX_CONNECTING') or 2,
+        "waitQueueTimeoutMS": _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        "connectTimeoutMS": _int_env('MONGO_CONNECT_TIMEOUT_MS') or 10000,
+        "serverSelectionTimeoutMS": _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 10000,
+        "socketTimeoutMS": _int_env('MONGO_SOCKET_TIMEOUT_MS'),
+        "readPreference": os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+        "appname": os.environ.get('MONGO_APP_NAME', 'skillswap'),
+    }
+    compressors = os.environ.get('MONGO_COMPRESSORS')
+    if compressors:
+        options["compressors"] = compressors
+    return {key: value for key, value in options.items() if value is not None}
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters fed by pymongo's CMAP events.
+    
+    Motor runs pymongo calls on worker threads, and a checkout's started and
+    finished events fire on the same thread, so the wait is timed thread-locally.
+    """
+    
+    def __init__(self, slow_checkout_ms: float = 50):
+        self.slow_checkout = slow_checkout_ms / 1000
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.open_connections = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.slow_checkouts = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.pool_clears = 0
+    
+    def _wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+    
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+    
+    def connection_checked_out(self, event):
+        waited = self._wait()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if waited >= self.slow_checkout:
+                self.slow_checkouts += 1
+    
+    def connection_check_out_failed(self, event):
+        waited = self._wait()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        logger.warning(f"Connection checkout failed after {waited * 1000:.1f}ms: {event.reason}")
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "checkedOut": self.checked_out,
+                "maxCheckedOut": self.max_checked_out,
+                "openConnections": self.open_connections,
+                "checkouts": self.checkouts,
+                "checkoutFailures": self.checkout_failures,
+                "slowCheckouts": self.slow_checkouts,
+                "avgWaitMs": round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "maxWaitMs": round(self.max_wait_seconds * 1000, 3),
+                "poolClears": self.pool_clears,
+            }
+
+class Mongo:
+    """Owns the process-wide Motor client; created on first use or by the app lifespan"""
+    
+    def __init__(self):
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.metrics = PoolMetrics(float(os.environ.get('MONGO_SLOW_CHECKOUT_MS', '50')))
+        self.commands = CommandMetrics()
+        self.options: Dict = {}
+    
+    def connect(self, url: Optional[str] = None, **overrides) -> AsyncIOMotorClient:
+        if self.client is None:
+            self.options = {**client_options(), **overrides}
+            self.client = AsyncIOMotorClient(
+                url or os.environ['MONGO_URL'], event_listeners=[self.metrics, self.commands], **self.options
+            )
+            logger.info(f"MongoDB client created (maxPoolSize={self.options.get('maxPoolSize')})")
+        return self.client
+    
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        return self.connect()[os.environ['DB_NAME']]
+    
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+    
+    def stats(self) -> Dict:
+        return {
+            "maxPoolSize": self.options.get("maxPoolSize"),
+            "minPoolSize": self.options.get("minPoolSize"),
+            "readPreference": self.options.get("readPreference"),
+            **self.metrics.stats(),
+        }
+
+class _Database:
+    """Module-level stand-in for the database so handlers keep writing `db.users`"""
+    
+    def __getattr__(self, name):
+        return getattr(mongo.db, name)
+    
+    def __getitem__(self, name):
+        return mongo.db[name]
+
+mongo = Mongo()
+db = _Database()
+
+@asynccontextmanager
+async def mongo_session(url: Optional[str] = None, **overrides):
+    """Yield the shared database for the duration of a script or app lifespan"""
+    mongo.connect(url, **overrides)
+    try:
+        yield mongo.db
+    finally:
+        mongo.close()
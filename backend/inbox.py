@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from database import mongo
+
+
+# An inbox update for the write pipeline: (userId, conversationId, fields to $set, unread $inc)
+InboxUpdate = Tuple[str, str, dict, int]
+
+def message_inbox_updates(message: dict, sender: dict, receiver: dict) -> List[InboxUpdate]:
+    """Inbox changes for both participants when `message` is sent"""
+    shared = {
+        "id": message["conversationId"],
+        "lastMessage": message["message"],
+        "lastMessageTime": message["createdAt"],
+    }
+    return [
+        (sender["id"], message["conversationId"], {
+            **shared,
+            "participantId": receiver["id"],
+            "participantName": receiver["name"],
+            "participantAvatar": receiver.get("avatar"),
+        }, 0),
+        (receiver["id"], message["conversationId"], {
+            **shared,
+            "participantId": sender["id"],
+            "participantName": sender["name"],
+            "participantAvatar": sender.get("avatar"),
+        }, 1),
+    ]
+
+def inbox_operations(updates: List[InboxUpdate]) -> List[UpdateOne]:
+    """Coalesce updates per (user, conversation): the newest fields win, unread increments add up
+    
+    Each entry gets an upserting $inc, then a $set that only applies if the stored
+    entry is not newer, so batches flushed out of order cannot roll it back. The
+    $set relies on the $inc having created the document: run them with ordered=True.
+    """
+    merged: Dict[Tuple[str, str], list] = {}
+    for user_id, conversation_id, fields, unread in updates:
+        entry = merged.setdefault((user_id, conversation_id), [{}, 0])
+        if fields["lastMessageTime"] >= entry[0].get("lastMessageTime", fields["lastMessageTime"]):
+            entry[0].update(fields)
+        entry[1] += unread
+    
+    operations = []
+    for (user_id, conversation_id), (fields, unread) in merged.items():
+        prefix = f"entries.{conversation_id}"
+        operations.append(UpdateOne(
+            {"userId": user_id}, {"$inc": {f"{prefix}.unreadCount": unread}}, upsert=True
+        ))
+        operations.append(UpdateOne(
+            {"userId": user_id, f"{prefix}.lastMessageTime": {"$not": {"$gt": fields["lastMessageTime"]}}},
+            {"$set": {f"{prefix}.{key}": value for key, value in fields.items()}}
+        ))
+    return operations
+
+def participant_profile_operations(user: dict, conversations: List[dict]) -> List[UpdateOne]:
+    """Refresh `user`'s name and avatar in the inboxes of everyone they talk to"""
+    operations = []
+    for conv in conversations:
+        for other_id in conv["participants"]:
+            if other_id == user["id"]:
+                continue
+            prefix = f"entries.{conv['id']}"
+            operations.append(UpdateOne(
+                {"userId": other_id, prefix: {"$exists": True}},
+                {"$set": {
+                    f"{prefix}.participantName": user["name"],
+                    f"{prefix}.participantAvatar": user.get("avatar"),
+                }}
+            ))
+    return operations
+
+def page_entries(
+    entries: Dict[str, dict], limit: int, after: Optional[Tuple[datetime, str]] = None
+) -> Tuple[List[dict], bool]:
+    """Newest-first page of inbox entries after the (lastMessageTime, id) cursor"""
+    ordered = sorted(entries.values(), key=lambda e: (e["lastMessageTime"], e["id"]), reverse=True)
+    if after:
+        ordered = [e for e in ordered if (e["lastMessageTime"], e["id"]) < after]
+    return ordered[:limit], len(ordered) > limit
+
+async def conversation_entries(db, user_id: str, conversations: List[dict]) -> List[dict]:
+    """Inbox entries computed from conversations, users and messages in three queries"""
+    other_ids = {
+        conv["id"]: next((p for p in conv["participants"] if p != user_id), None)
+        for conv in conversations
+    }
+    
+    # One batched profile fetch for every participant
+    other_users = await db.users.find(
+        {"id": {"$in": [uid for uid in other_ids.values() if uid]}},
+        {"_id": 0, "id": 1, "name": 1, "avatar": 1}
+    ).to_list(None)
+    users_by_id = {user["id"]: user for user in other_users}
+    
+    # One aggregation for the unread counts of every conversation
+    unread_counts = {}
+    if conversations:
+        pipeline = [
+            {"$match": {
+                "conversationId": {"$in": list(other_ids.keys())},
+                "receiverId": user_id,
+                "read": False
+            }},
+            {"$group": {"_id": "$conversationId", "count": {"$sum": 1}}}
+        ]
+        async for row in db.messages.aggregate(pipeline):
+            unread_counts[row["_id"]] = row["count"]
+    
+    entries = []
+    for conv in conversations:
+        other_user = users_by_id.get(other_ids[conv["id"]])
+        if other_user:
+            entries.append({
+                "id": conv["id"],
+                "participantId": other_user["id"],
+                "participantName": other_user["name"],
+                "participantAvatar": other_user.get("avatar"),
+                "lastMessage": conv.get("lastMessage", ""),
+                "lastMessageTime": conv.get("lastMessageTime", conv["createdAt"]),
+                "unreadCount": unread_counts.get(conv["id"], 0)
+            })
+    return entries
+
+async def compute_inbox(db, user_id: str) -> Dict[str, dict]:
+    conversations = await db.conversations.find({"participants": user_id}, {"_id": 0}).to_list(None)
+    return {entry["id"]: entry for entry in await conversation_entries(db, user_id, conversations)}
+
+async def complete_inbox(db, user_id: str, stored: Dict[str, dict]) -> Dict[str, dict]:
+    """Add the conversations a message-created inbox is missing and mark the document complete
+    
+    Message traffic upserts an inbox holding only the conversations written since;
+    older ones are computed once from the source, and entries already stored win.
+    """
+    missing = {cid: entry for cid, entry in (await compute_inbox(db, user_id)).items() if cid not in stored}
+    update = {"$set": {**{f"entries.{cid}": entry for cid, entry in missing.items()}, "complete": True}}
+    try:
+        await db.inboxes.update_one({"userId": user_id}, update, upsert=True)
+    except DuplicateKeyError:
+        # A message upserted the document first
+        await db.inboxes.update_one({"userId": user_id}, update)
+    return {**missing, **stored}
+
+def _normalize(entries: Dict[str, dict]) -> Dict[str, dict]:
+    # Mongo stores datetimes at millisecond precision
+    return {
+        cid: {**entry, "lastMessageTime": entry["lastMessageTime"].replace(
+            microsecond=entry["lastMessageTime"].microsecond // 1000 * 1000)}
+        for cid, entry in entries.items()
+    }
+
+async def rebuild_inboxes(
+    db, repair: bool = True, concurrency: int = 20, user_ids: Optional[Iterable[str]] = None
+) -> dict:
+    """Recompute every inbox (or just `user_ids`') from the source collections; report (and optionally fix) drift"""
+    stats = {"users": 0, "drifted": 0, "repaired": 0}
+    drifted_ids: List[str] = []
+    
+    async def check(user_id: str):
+        expected = await compute_inbox(db, user_id)
+        stored = await db.inboxes.find_one({"userId": user_id}, {"_id": 0, "entries": 1})
+        stored_entries = (stored or {}).get("entries", {})
+        if _normalize(stored_entries) != _normalize(expected):
+            stats["drifted"] += 1
+            drifted_ids.append(user_id)
+            if repair:
+                return ReplaceOne(
+                    {"userId": user_id}, {"userId": user_id, "entries": expected, "complete": True}, upsert=True
+                )
+        return None
+    
+    batch = []
+    async def flush():
+        operations = [op for op in await asyncio.gather(*[check(uid) for uid in batch]) if op]
+        if operations:
+            await db.inboxes.bulk_write(operations, ordered=False)
+            stats["repaired"] += len(operations)
+        batch.clear()
+    
+    async def all_user_ids():
+        async for user in db.users.find({}, {"_id": 0, "id": 1}):
+            yield user["id"]
+    
+    async def given_user_ids():
+        for user_id in user_ids:
+            yield user_id
+    
+    async for user_id in (all_user_ids() if user_ids is None else given_user_ids()):
+        stats["users"] += 1
+        batch.append(user_id)
+        if len(batch) >= concurrency:
+            await flush()
+    if batch:
+        await flush()
+    
+    stats["sample"] = drifted_ids[:10]
+    return stats
+
+async def main(repair: bool):
+    db = mongo.db
+    
+    stats = await rebuild_inboxes(db, repair=repair)
+    print(f"Checked {stats['users']} inboxes: {stats['drifted']} drifted, {stats['repaired']} repaired")
+    if stats["sample"]:
+        print(f"  e.g. {', '.join(stats['sample'])}")
+    
+    mongo.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify or rebuild per-user inbox projections")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+    asyncio.run(main(args.command == "rebuild"))
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import logging
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from database import mongo
+
+
+logger = logging.getLogger(__name__)
+
+# Indexes required by the queries in server.py, keyed by collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("searchTokens", ASCENDING)], name="searchTokens"),
+        IndexModel([("skillsToTeach", ASCENDING)], name="skillsToTeach"),
+        IndexModel([("updatedAt", ASCENDING)], name="updatedAt"),
+    ],
+    "conversations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Partial so legacy documents without a key do not collide before migration
+        IndexModel(
+            [("pairKey", ASCENDING)], name="pairKey_unique", unique=True,
+            partialFilterExpression={"pairKey": {"$exists": True}}
+        ),
+        IndexModel(
+            [("participants", ASCENDING), ("lastMessageTime", DESCENDING), ("id", DESCENDING)],
+            name="participants_lastMessageTime"
+        ),
+    ],
+    "messages": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("conversationId", ASCENDING), ("createdAt", ASCENDING), ("id", ASCENDING)],
+            name="conversationId_createdAt"
+        ),
+        # Partial so messages from before sequence numbers do not collide
+        IndexModel(
+            [("conversationId", ASCENDING), ("seq", ASCENDING)], name="conversationId_seq", unique=True,
+            partialFilterExpression={"seq": {"$gt": 0}}
+        ),
+        IndexModel(
+            [("conversationId", ASCENDING), ("receiverId", ASCENDING), ("read", ASCENDING)],
+            name="conversationId_receiverId_read"
+        ),
+    ],
+    "inboxes": [
+        IndexModel([("userId", ASCENDING)], name="userId_unique", unique=True),
+    ],
+    "match_recommendations": [
+        IndexModel([("userId", ASCENDING)], name="userId_unique", unique=True),
+    ],
+    "skill_cooccurrence": [
+        IndexModel([("skill", ASCENDING)], name="skill_unique", unique=True),
+        IndexModel([("computedAt", ASCENDING)], name="computedAt"),
+    ],
+}
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index; safe to call repeatedly"""
+    created = {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # Typically a unique index over data that already has duplicates
+            logger.error(f"Could not create indexes on {collection}: {e}")
+            created[collection] = []
+    return created
+
+async def index_report(db) -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared indexes with the live ones and their $indexStats usage"""
+    report = {}
+    for collection, models in INDEXES.items():
+        declared = [model.document["name"] for model in models]
+        existing = await db[collection].index_information()
+        
+        usage = {}
+        try:
+            async for stat in db[collection].aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat["accesses"]["ops"]
+        except OperationFailure as e:
+            logger.warning(f"$indexStats unavailable for {collection}: {e}")
+        
+        report[collection] = {
+            "missing": [name for name in declared if name not in existing],
+            "undeclared": [name for name in existing if name != "_id_" and name not in declared],
+            "unused": [name for name, ops in usage.items() if name != "_id_" and ops == 0],
+        }
+    return report
+
+async def main(report_only: bool):
+    db = mongo.db
+    
+    if not report_only:
+        created = await ensure_indexes(db)
+        for collection, names in created.items():
+            print(f"✓ {collection}: {', '.join(names) or 'no indexes created'}")
+    
+    report = await index_report(db)
+    for collection, entry in report.items():
+        print(f"{collection}:")
+        for key in ("missing", "undeclared", "unused"):
+            print(f"  {key}: {', '.join(entry[key]) or '-'}")
+    
+    mongo.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and audit MongoDB indexes")
+    parser.add_argument("--report", action="store_true", help="only report, do not create indexes")
+    args = parser.parse_args()
+    asyncio.run(main(args.report))
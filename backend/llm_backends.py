@@ -0,0 +1,75 @@
+import asyncio
+import os
+import random
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+class LLMBackend(ABC):
+    """Sends one prompt to a chat model and returns the full completion"""
+    
+    @abstractmethod
+    async def complete(self, provider: str, model: str, session_id: str, system_message: str, prompt: str) -> str:
+        ...
+    
+    async def stream(self, provider: str, model: str, session_id: str, system_message: str, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion in chunks; backends without streaming yield it whole"""
+        yield await self.complete(provider, model, session_id, system_message, prompt)
+
+class EmergentBackend(LLMBackend):
+    def __init__(self, api_key: Optional[str]):
+        # Imported here so the stub backend works without the integration package
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+        self.api_key = api_key
+        self.chat_class = LlmChat
+        self.message_class = UserMessage
+    
+    async def complete(self, provider: str, model: str, session_id: str, system_message: str, prompt: str) -> str:
+        chat = self.chat_class(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(provider, model)
+        return await chat.send_message(self.message_class(text=prompt))
+
+class StubLLMError(Exception):
+    pass
+
+class StubBackend(LLMBackend):
+    """Offline backend with injectable latency and failures for load testing"""
+    
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+    
+    async def complete(self, provider: str, model: str, session_id: str, system_message: str, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < self.failure_rate:
+            raise StubLLMError(f"Injected failure from stub {provider}/{model}")
+        return self._reply(model, prompt)
+    
+    async def stream(self, provider: str, model: str, session_id: str, system_message: str, prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self._reply(model, prompt).split(" ")
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)) / len(words)
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            if i == len(words) // 2 and self.random.random() < self.failure_rate:
+                raise StubLLMError(f"Injected mid-stream failure from stub {provider}/{model}")
+            yield word if i == 0 else " " + word
+    
+    def _reply(self, model: str, prompt: str) -> str:
+        return f"[stub {model}] {' '.join(prompt.split())[:200]}"
+
+def create_backend(api_key: Optional[str]) -> LLMBackend:
+    """Pick the backend from LLM_BACKEND ("emergent" or "stub")"""
+    if os.getenv("LLM_BACKEND", "emergent").lower() == "stub":
+        return StubBackend(
+            latency=float(os.getenv("LLM_STUB_LATENCY", "0.5")),
+            jitter=float(os.getenv("LLM_STUB_JITTER", "0.1")),
+            failure_rate=float(os.getenv("LLM_STUB_FAILURE_RATE", "0.0")),
+        )
+    return EmergentBackend(api_key)
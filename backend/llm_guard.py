@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Awaitable, Callable, Dict
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "15"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after a cool-down"""
+    
+    def __init__(self, failure_threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+class LLMGuard:
+    """Per-model concurrency cap, per-attempt timeout, overall deadline, retries and breaker"""
+    
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        deadline: float = LLM_DEADLINE_SECONDS,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+    ):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.semaphores: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(max_concurrency))
+        self.breakers: Dict[str, CircuitBreaker] = defaultdict(CircuitBreaker)
+        self.counters = defaultdict(int)
+    
+    async def call(self, model: str, fn: Callable[[], Awaitable[str]]) -> str:
+        breaker = self.breakers[model]
+        is_trial = breaker.state == "half_open"
+        if not breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"Circuit open for {model}")
+        
+        try:
+            return await asyncio.wait_for(self._attempts(model, fn), self.deadline)
+        except Exception:
+            self.counters["failures"] += 1
+            raise
+        finally:
+            if is_trial:
+                # A trial cut short by the deadline must not block the next one
+                breaker.trial_in_flight = False
+    
+    async def _attempts(self, model: str, fn: Callable[[], Awaitable[str]]) -> str:
+        breaker = self.breakers[model]
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_random_exponential(multiplier=0.25, max=4),
+            # Never retry cancellation (the overall deadline) or an opened circuit
+            retry=retry_if_exception(lambda e: isinstance(e, Exception) and not isinstance(e, CircuitOpenError)),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    self.counters["retries"] += 1
+                async with self.semaphores[model]:
+                    # The circuit may have opened while this call was queued
+                    if breaker.state == "open":
+                        self.counters["short_circuited"] += 1
+                        raise CircuitOpenError(f"Circuit opened for {model} while queued")
+                    try:
+                        result = await asyncio.wait_for(fn(), self.timeout)
+                    except Exception:
+                        breaker.record_failure()
+                        raise
+                    breaker.record_success()
+                    return result
+    
+    async def stream(self, model: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Relay a streamed completion under the same cap and breaker, without retries
+        
+        `timeout` bounds the wait for each chunk rather than the whole generation.
+        Closing this generator (e.g. on client disconnect) closes the upstream one.
+        """
+        breaker = self.breakers[model]
+        is_trial = breaker.state == "half_open"
+        if not breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"Circuit open for {model}")
+        
+        try:
+            async with self.semaphores[model]:
+                upstream = open_stream()
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(upstream.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            break
+                        yield chunk
+                except Exception:
+                    self.counters["failures"] += 1
+                    breaker.record_failure()
+                    raise
+                finally:
+                    await upstream.aclose()
+                breaker.record_success()
+        finally:
+            if is_trial:
+                breaker.trial_in_flight = False
+    
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "circuits": {model: breaker.state for model, breaker in self.breakers.items()},
+        }
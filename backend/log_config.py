@@ -0,0 +1,46 @@
+import atexit
+import logging
+import os
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Socket.IO/Engine.IO log every packet at INFO; keep one record in N
+SOCKETIO_LOG_SAMPLE_EVERY = int(os.getenv("SOCKETIO_LOG_SAMPLE_EVERY", "100"))
+
+class SampleFilter(logging.Filter):
+    """Let through every Nth record below WARNING; warnings and errors always pass"""
+    
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self.seen = 0
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        self.seen += 1
+        return self.seen % self.every == 1 or self.every == 1
+
+def configure_logging(level: int = logging.INFO) -> QueueListener:
+    """Replace the root handlers with a queue; formatting and stream I/O move to a listener thread"""
+    queue = SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(queue)]
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def sampled_logger(name: str, every: int = SOCKETIO_LOG_SAMPLE_EVERY) -> logging.Logger:
+    """An INFO logger that keeps one record in `every` (for python-socketio's `logger=` options)"""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    if not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter(every))
+    return logger
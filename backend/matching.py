@@ -0,0 +1,191 @@
+import bisect
+import heapq
+import math
+import os
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Candidates scored per request; reciprocal matches are kept first when there are more
+MATCH_MAX_CANDIDATES = int(os.getenv("MATCH_MAX_CANDIDATES", "1000"))
+# Best-reputed users kept ranked for the no-overlap fallback
+MATCH_FALLBACK_POOL = int(os.getenv("MATCH_FALLBACK_POOL", "500"))
+
+# Fields needed to index a user; use as a Mongo projection when loading
+MATCH_FIELDS = {
+    "_id": 0, "id": 1, "skillsToTeach": 1, "skillsToLearn": 1,
+    "rating": 1, "completedExchanges": 1, "location": 1
+}
+
+def normalize_skill(skill: str) -> str:
+    return " ".join(skill.lower().split())
+
+def normalize_skills(skills: Optional[Iterable[str]]) -> Set[str]:
+    return {normalize_skill(s) for s in skills or [] if s and s.strip()}
+
+class SkillMatchIndex:
+    """In-memory inverted index from skill to user IDs for reciprocal skill matching
+    
+    `recommend` does bounded work on the event loop: candidates come from C-level
+    set operations on the posting lists and at most `max_candidates` are scored,
+    and the fallback ranks a pool of the best-reputed users that upserts keep
+    current instead of scanning every profile.
+    """
+    
+    def __init__(
+        self,
+        learn_weight: float = float(os.getenv("MATCH_WEIGHT_LEARN", "3.0")),
+        teach_weight: float = float(os.getenv("MATCH_WEIGHT_TEACH", "2.0")),
+        reciprocal_weight: float = float(os.getenv("MATCH_WEIGHT_RECIPROCAL", "4.0")),
+        rating_weight: float = float(os.getenv("MATCH_WEIGHT_RATING", "1.0")),
+        exchanges_weight: float = float(os.getenv("MATCH_WEIGHT_EXCHANGES", "0.5")),
+        location_weight: float = float(os.getenv("MATCH_WEIGHT_LOCATION", "1.0")),
+        max_candidates: int = MATCH_MAX_CANDIDATES,
+        fallback_pool: int = MATCH_FALLBACK_POOL,
+    ):
+        self.learn_weight = learn_weight
+        self.teach_weight = teach_weight
+        self.reciprocal_weight = reciprocal_weight
+        self.rating_weight = rating_weight
+        self.exchanges_weight = exchanges_weight
+        self.location_weight = location_weight
+        self.max_candidates = max_candidates
+        self.fallback_pool = fallback_pool
+        
+        self.teachers: Dict[str, Set[str]] = defaultdict(set)
+        self.learners: Dict[str, Set[str]] = defaultdict(set)
+        self.profiles: Dict[str, dict] = {}
+        # (-reputation, user_id), best first
+        self.reputable: List[Tuple[float, str]] = []
+        self.reputable_ids: Set[str] = set()
+    
+    def __len__(self) -> int:
+        return len(self.profiles)
+    
+    def load(self, users: Iterable[dict]):
+        for user in users:
+            self.upsert(user)
+    
+    def upsert(self, user: dict):
+        """Add or replace a user's entry; cost is proportional to their skill count"""
+        self.remove(user["id"])
+        profile = {
+            "teach": normalize_skills(user.get("skillsToTeach")),
+            "learn": normalize_skills(user.get("skillsToLearn")),
+            "rating": user.get("rating") or 0.0,
+            "completedExchanges": user.get("completedExchanges") or 0,
+            "location": (user.get("location") or "").strip().lower(),
+        }
+        self.profiles[user["id"]] = profile
+        for skill in profile["teach"]:
+            self.teachers[skill].add(user["id"])
+        for skill in profile["learn"]:
+            self.learners[skill].add(user["id"])
+        self._rank_reputation(user["id"], profile)
+    
+    def _rank_reputation(self, user_id: str, profile: dict):
+        entry = (-self._base_reputation(profile), user_id)
+        if len(self.reputable) >= self.fallback_pool and entry >= self.reputable[-1]:
+            return
+        bisect.insort(self.reputable, entry)
+        self.reputable_ids.add(user_id)
+        if len(self.reputable) > self.fallback_pool:
+            self.reputable_ids.discard(self.reputable.pop()[1])
+    
+    def _refill_reputation(self):
+        best = heapq.nsmallest(
+            self.fallback_pool, ((-self._base_reputation(p), uid) for uid, p in self.profiles.items())
+        )
+        self.reputable = best
+        self.reputable_ids = {uid for _, uid in best}
+    
+    def remove(self, user_id: str):
+        profile = self.profiles.pop(user_id, None)
+        if not profile:
+            return
+        for skill in profile["teach"]:
+            self.teachers[skill].discard(user_id)
+            if not self.teachers[skill]:
+                del self.teachers[skill]
+        for skill in profile["learn"]:
+            self.learners[skill].discard(user_id)
+            if not self.learners[skill]:
+                del self.learners[skill]
+        if user_id in self.reputable_ids:
+            self.reputable_ids.discard(user_id)
+            self.reputable.remove((-self._base_reputation(profile), user_id))
+            # Removals only shrink the pool; refill with one scan once half of it is gone
+            if len(self.reputable) < self.fallback_pool // 2 and len(self.profiles) > len(self.reputable):
+                self._refill_reputation()
+    
+    def _base_reputation(self, profile: dict) -> float:
+        score = self.rating_weight * profile["rating"] / 5.0
+        return score + self.exchanges_weight * math.log1p(profile["completedExchanges"])
+    
+    def _reputation(self, profile: dict, location: str) -> float:
+        score = self._base_reputation(profile)
+        if location and profile["location"] == location:
+            score += self.location_weight
+        return score
+    
+    def score(self, user: dict, candidate: dict) -> float:
+        """Score how good an exchange `candidate` is for `user` (both index profiles)"""
+        gets = len(user["learn"] & candidate["teach"])
+        gives = len(user["teach"] & candidate["learn"])
+        score = self.learn_weight * gets + self.teach_weight * gives
+        score += self.reciprocal_weight * min(gets, gives)
+        return score + self._reputation(candidate, user["location"])
+    
+    def _candidates(self, user_id: str, user: dict) -> Set[str]:
+        """Up to max_candidates users sharing a skill with `user`, reciprocal matches first
+        
+        Never unions whole posting lists: pairwise intersections cost O(smaller list)
+        and one-sided matches are sliced from the lists until the cap is reached.
+        """
+        teach_to_me = [self.teachers[skill] for skill in user["learn"] if skill in self.teachers]
+        learn_from_me = [self.learners[skill] for skill in user["teach"] if skill in self.learners]
+        
+        candidates: Set[str] = set()
+        for teachers in teach_to_me:
+            for learners in learn_from_me:
+                candidates |= teachers & learners
+        candidates.discard(user_id)
+        if len(candidates) > self.max_candidates:
+            return set(islice(candidates, self.max_candidates))
+        
+        for postings in teach_to_me + learn_from_me:
+            room = self.max_candidates + 1 - len(candidates)  # +1: the user may be in the slice
+            if room <= 1:
+                break
+            candidates.update(islice(postings, room))
+        candidates.discard(user_id)
+        return set(islice(candidates, self.max_candidates)) if len(candidates) > self.max_candidates else candidates
+    
+    def recommend(self, user_id: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """Return up to `limit` (user_id, score) pairs, best first"""
+        user = self.profiles.get(user_id)
+        if not user:
+            return []
+        
+        candidates = self._candidates(user_id, user)
+        
+        scored = heapq.nlargest(
+            limit,
+            ((cid, self.score(user, self.profiles[cid])) for cid in candidates),
+            key=lambda item: item[1]
+        )
+        
+        # Too few skill overlaps: fill from the best-reputed pool (location bonus applied within it)
+        if len(scored) < limit:
+            seen = {cid for cid, _ in scored} | {user_id}
+            scored += heapq.nlargest(
+                limit - len(scored),
+                (
+                    (cid, self._reputation(self.profiles[cid], user["location"]))
+                    for _, cid in self.reputable if cid not in seen
+                ),
+                key=lambda item: item[1]
+            )
+        return scored
+
+match_index = SkillMatchIndex()
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from inbox import InboxUpdate, inbox_operations
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_BATCH_WINDOW_MS = float(os.getenv("MESSAGE_BATCH_WINDOW_MS", "5"))
+MESSAGE_BATCH_MAX = int(os.getenv("MESSAGE_BATCH_MAX", "500"))
+MESSAGE_QUEUE_MAX = int(os.getenv("MESSAGE_QUEUE_MAX", "10000"))
+MESSAGE_FLUSH_CONCURRENCY = int(os.getenv("MESSAGE_FLUSH_CONCURRENCY", "4"))
+
+DUPLICATE_KEY = 11000
+
+Pending = Tuple[dict, dict, List[InboxUpdate], asyncio.Future]
+
+class MessageWriter:
+    """Write-behind pipeline batching message inserts and conversation updates
+    
+    Callers get a future that resolves once their message is flushed. Up to
+    `flush_concurrency` batches are written at once while the next one fills;
+    conversation and inbox updates only apply when newer than what is stored,
+    so batches may finish in any order. The queue is bounded, so when Mongo falls behind, submit() waits instead
+    of growing memory without limit.
+    """
+    
+    def __init__(
+        self,
+        batch_window: float = MESSAGE_BATCH_WINDOW_MS / 1000,
+        max_batch: int = MESSAGE_BATCH_MAX,
+        max_queue: int = MESSAGE_QUEUE_MAX,
+        flush_concurrency: int = MESSAGE_FLUSH_CONCURRENCY,
+    ):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.flush_concurrency = flush_concurrency
+        self.db = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flushes: Set[asyncio.Task] = set()
+        self.counters = {"messages": 0, "batches": 0, "errors": 0}
+    
+    def start(self, db):
+        self.db = db
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self.task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Flush everything queued so far, then stop the background task"""
+        if self.task is None:
+            return
+        await self.queue.join()
+        await asyncio.gather(*self.flushes)
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+    
+    def stats(self) -> dict:
+        return {**self.counters, "queued": self.queue.qsize() if self.queue else 0}
+    
+    async def submit(
+        self, message: dict, conversation_update: dict, inbox_updates: List[InboxUpdate] = ()
+    ) -> asyncio.Future:
+        """Queue a message with its conversation $set and inbox changes; await the future for durability"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((message, conversation_update, list(inbox_updates), future))
+        return future
+    
+    async def _run(self):
+        flush_slots = asyncio.Semaphore(self.flush_concurrency)
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await flush_slots.acquire()
+            flush = asyncio.create_task(self._flush_and_release(batch, flush_slots))
+            self.flushes.add(flush)
+            flush.add_done_callback(self.flushes.discard)
+    
+    async def _flush_and_release(self, batch: List[Pending], flush_slots: asyncio.Semaphore):
+        try:
+            await self._flush(batch)
+        finally:
+            flush_slots.release()
+            for _ in batch:
+                self.queue.task_done()
+    
+    async def _insert(self, batch: List[Pending]) -> Tuple[List[Pending], Dict[int, Exception]]:
+        """Insert the batch's messages; returns the written entries and the errors of the rest by index"""
+        try:
+            await self.db.messages.insert_many([message for message, *_ in batch], ordered=False)
+            return batch, {}
+        except BulkWriteError as e:
+            # A duplicate id means an earlier attempt already stored that message
+            failed = {
+                error["index"]: BulkWriteError({"writeErrors": [error]})
+                for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY
+            }
+        except Exception as e:
+            failed = dict.fromkeys(range(len(batch)), e)
+        return [entry for index, entry in enumerate(batch) if index not in failed], failed
+    
+    async def _flush(self, batch: List[Pending]):
+        written, failed = await self._insert(batch)
+        if failed:
+            self.counters["errors"] += 1
+            logger.error(f"{len(failed)} of {len(batch)} messages in a batch failed: {next(iter(failed.values()))}")
+            for index, error in failed.items():
+                future = batch[index][3]
+                if not future.done():
+                    future.set_exception(error)
+        if not written:
+            return
+        
+        # Only the newest update per conversation needs to reach Mongo
+        latest: Dict[str, dict] = {}
+        inbox_updates: List[InboxUpdate] = []
+        for message, update, inbox, _ in written:
+            current = latest.get(message["conversationId"])
+            if current is None or update["lastMessageTime"] >= current["lastMessageTime"]:
+                latest[message["conversationId"]] = update
+            inbox_updates.extend(inbox)
+        
+        # The messages are stored; a failed projection update is repaired by `inbox.py rebuild`
+        try:
+            await self.db.conversations.bulk_write([
+                UpdateOne({"id": conv_id, "lastMessageTime": {"$not": {"$gt": update["lastMessageTime"]}}}, {"$set": update})
+                for conv_id, update in latest.items()
+            ], ordered=False)
+            if inbox_updates:
+                await self.db.inboxes.bulk_write(inbox_operations(inbox_updates), ordered=True)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Conversation updates for a batch of {len(written)} messages failed: {e}")
+        
+        self.counters["messages"] += len(written)
+        self.counters["batches"] += 1
+        for *_, future in written:
+            if not future.done():
+                future.set_result(None)
+
+message_writer = MessageWriter()
@@ -0,0 +1,259 @@
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, FrozenSet, Iterable, List, Sequence, Tuple
+from pymongo import monitoring
+
+# Seconds; covers sub-millisecond cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self.series: Dict[LabelValues, list] = {}
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.series.items())
+        lines = super().render()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+def _snake(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+class Registry:
+    """Metrics plus callbacks that report other components' stats at scrape time"""
+    
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Tuple[str, Callable[[], Dict[str, float]], FrozenSet[str]]] = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+    
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+    
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+    
+    def add_collector(self, prefix: str, collect: Callable[[], Dict[str, float]], counters: Iterable[str] = ()):
+        """`collect()` returns {statName: number}; each becomes the gauge `<prefix>_<stat_name>`,
+        or the counter `<prefix>_<stat_name>_total` if it is named in `counters`"""
+        self.collectors.append((prefix, collect, frozenset(counters)))
+    
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, collect, counters in self.collectors:
+            for stat, value in collect().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if stat in counters:
+                    name, kind = f"{prefix}_{_snake(stat)}_total", "counter"
+                else:
+                    name, kind = f"{prefix}_{_snake(stat)}", "gauge"
+                lines.extend([f"# TYPE {name} {kind}", f"{name} {_format_value(value)}"])
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# ============= HTTP =============
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled", ("method",))
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency histogram and in-flight gauge.
+    
+    The route template comes from FastAPI's matched route, so `/api/users/{user_id}`
+    is one series rather than one per user. It is only known once routing has run,
+    so the in-flight gauge is labelled by method alone.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+    
+        method = scope["method"]
+        status = {"code": 500}
+    
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+    
+        HTTP_IN_FLIGHT.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=method, route=getattr(route, "path", "unmatched"), status=status["code"]
+            )
+
+# ============= MongoDB =============
+
+MONGO_COMMAND_SECONDS = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time", ("command", "collection", "outcome")
+)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every command by name and collection from pymongo's command monitoring events"""
+    
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+    
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) else ""
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+    
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1_000_000,
+            command=event.command_name, collection=collection, outcome=outcome
+        )
+    
+    def succeeded(self, event):
+        self._finish(event, "ok")
+    
+    def failed(self, event):
+        self._finish(event, "error")
+
+# ============= AI =============
+
+AI_CALL_SECONDS = registry.histogram(
+    "ai_call_duration_seconds", "AIService call latency, including cache hits", ("operation", "outcome")
+)
+
+@contextmanager
+def ai_timer(operation: str):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        AI_CALL_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+
+# ============= Socket.IO =============
+
+SOCKETIO_CONNECTIONS = registry.counter(
+    "socketio_connections_total", "Socket.IO connection attempts", ("outcome",)
+)
+SOCKETIO_DISCONNECTS = registry.counter("socketio_disconnects_total", "Socket.IO disconnects")
+SOCKETIO_CONNECTED = registry.gauge("socketio_connected_clients", "Currently connected Socket.IO clients")
+SOCKETIO_EMITS = registry.counter("socketio_emits_total", "Events emitted by the server", ("event",))
+SOCKETIO_ROOM_EVENTS = registry.counter("socketio_room_events_total", "Room membership changes", ("action",))
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+from pymongo import UpdateOne
+from database import mongo
+from inbox import rebuild_inboxes
+from models import conversation_pair_key
+
+
+async def merge_duplicate_conversations(db, dry_run: bool = False) -> dict:
+    """Give every conversation a pairKey and fold duplicates of a pair into the oldest one
+    
+    The participants' inboxes are rebuilt afterwards so no entry points at a removed conversation.
+    Run this script again whenever a conversation may have been created without a
+    pairKey (by a worker still on older code): reserve_message_seq then opens a second,
+    numbered conversation for the pair, which is folded back in here and renumbered
+    by backfill_message_seq.
+    """
+    groups = {}
+    async for conv in db.conversations.find({}, {"_id": 0, "id": 1, "participants": 1, "createdAt": 1,
+                                                  "lastMessage": 1, "lastMessageTime": 1}):
+        if len(conv["participants"]) != 2:
+            continue
+        key = conversation_pair_key(*conv["participants"])
+        groups.setdefault(key, []).append(conv)
+    
+    stats = {"pairs": len(groups), "merged": 0, "messagesMoved": 0, "inboxesRepaired": 0}
+    affected_users = set()
+    for key, convs in groups.items():
+        convs.sort(key=lambda c: (c["createdAt"], c["id"]))
+        keep, duplicates = convs[0], convs[1:]
+        latest = max(convs, key=lambda c: c.get("lastMessageTime") or c["createdAt"])
+        
+        if duplicates:
+            stats["merged"] += len(duplicates)
+            affected_users.update(keep["participants"])
+            duplicate_ids = [c["id"] for c in duplicates]
+            if dry_run:
+                stats["messagesMoved"] += await db.messages.count_documents({"conversationId": {"$in": duplicate_ids}})
+                continue
+            moved = await db.messages.update_many(
+                {"conversationId": {"$in": duplicate_ids}},
+                {"$set": {"conversationId": keep["id"]}}
+            )
+            stats["messagesMoved"] += moved.modified_count
+            await db.conversations.delete_many({"id": {"$in": duplicate_ids}})
+        
+        if not dry_run:
+            await db.conversations.update_one(
+                {"id": keep["id"]},
+                {"$set": {
+                    "pairKey": key,
+                    "lastMessage": latest.get("lastMessage", ""),
+                    "lastMessageTime": latest.get("lastMessageTime") or latest["createdAt"]
+                }}
+            )
+    
+    if affected_users and not dry_run:
+        repaired = await rebuild_inboxes(db, user_ids=sorted(affected_users))
+        stats["inboxesRepaired"] = repaired["repaired"]
+    return stats
+
+async def backfill_message_seq(db, dry_run: bool = False) -> dict:
+    """Number the messages of conversations that predate sequence numbers and set their lastSeq
+    
+    Run before deploying sequence numbers: a conversation that already got a new
+    message has a lastSeq and is skipped, leaving its older messages unnumbered.
+    Messages merged in from a numbered duplicate lose their seq and are numbered
+    with the rest, so they cannot collide on the (conversationId, seq) index.
+    """
+    stats = {"conversations": 0, "messages": 0}
+    async for conv in db.conversations.find({"lastSeq": {"$exists": False}}, {"_id": 0, "id": 1}):
+        operations = []
+        cursor = db.messages.find({"conversationId": conv["id"]}, {"_id": 0, "id": 1}).sort([("createdAt", 1), ("id", 1)])
+        async for message in cursor:
+            operations.append(UpdateOne({"id": message["id"]}, {"$set": {"seq": len(operations) + 1}}))
+        stats["conversations"] += 1
+        stats["messages"] += len(operations)
+        if dry_run:
+            continue
+        if operations:
+            await db.messages.update_many(
+                {"conversationId": conv["id"], "seq": {"$exists": True}}, {"$unset": {"seq": ""}}
+            )
+            await db.messages.bulk_write(operations, ordered=False)
+        await db.conversations.update_one({"id": conv["id"]}, {"$set": {"lastSeq": len(operations)}})
+    return stats
+
+async def main(dry_run: bool):
+    db = mongo.db
+    
+    stats = await merge_duplicate_conversations(db, dry_run)
+    prefix = "Would merge" if dry_run else "✓ Merged"
+    print(f"{prefix} {stats['merged']} duplicate conversations across {stats['pairs']} pairs "
+          f"({stats['messagesMoved']} messages moved, {stats['inboxesRepaired']} inboxes rebuilt)")
+    
+    stats = await backfill_message_seq(db, dry_run)
+    prefix = "Would number" if dry_run else "✓ Numbered"
+    print(f"{prefix} {stats['messages']} messages in {stats['conversations']} conversations")
+    
+    mongo.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill conversation pair keys and message sequence numbers, merge duplicates. "
+                    "Run again after any conversation is created without a pairKey."
+    )
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
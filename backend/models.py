@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import uuid
 
@@ -15,6 +15,7 @@ class User(BaseModel):
     skillsToLearn: List[str] = []
     rating: float = 0.0
     completedExchanges: int = 0
+    searchTokens: List[str] = []
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
@@ -39,13 +40,13 @@ class UserResponse(BaseModel):
     id: str
     name: str
     email: str
-    avatar: Optional[str]
-    bio: str
-    location: str
-    skillsToTeach: List[str]
-    skillsToLearn: List[str]
-    rating: float
-    completedExchanges: int
+    avatar: Optional[str] = None
+    bio: str = ""
+    location: str = ""
+    skillsToTeach: List[str] = []
+    skillsToLearn: List[str] = []
+    rating: float = 0.0
+    completedExchanges: int = 0
 
 class Message(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -54,15 +55,24 @@ class Message(BaseModel):
     receiverId: str
     message: str
     read: bool = False
+    seq: int = 0  # per-conversation, assigned from Conversation.lastSeq
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
 class MessageCreate(BaseModel):
     receiverId: str
     message: str
 
+class ResumeRequest(BaseModel):
+    lastSeq: Dict[str, int] = {}  # conversationId -> highest seq the client has
+
+def conversation_pair_key(user1_id: str, user2_id: str) -> str:
+    return ":".join(sorted([user1_id, user2_id]))
+
 class Conversation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     participants: List[str]
+    pairKey: str = ""
+    lastSeq: int = 0
     lastMessage: str = ""
     lastMessageTime: datetime = Field(default_factory=datetime.utcnow)
     createdAt: datetime = Field(default_factory=datetime.utcnow)
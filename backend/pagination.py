@@ -0,0 +1,52 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+
+def encode_cursor(timestamp: datetime, item_id: str) -> str:
+    """Encode a (timestamp, id) sort key as an opaque cursor string"""
+    raw = f"{timestamp.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, item_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), item_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def keyset_filter(field: str, cursor: Optional[str], older: bool = True) -> dict:
+    """Build a Mongo filter selecting rows strictly past the cursor on (field, id)"""
+    if not cursor:
+        return {}
+    timestamp, item_id = decode_cursor(cursor)
+    op = "$lt" if older else "$gt"
+    return {
+        "$or": [
+            {field: {op: timestamp}},
+            {field: timestamp, "id": {op: item_id}}
+        ]
+    }
+
+def encode_rank_cursor(score: float, item_id: str) -> str:
+    """Encode a (score, id) position in a relevance-ranked list"""
+    raw = f"{score!r}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        score, item_id = raw.split("|", 1)
+        return float(score), item_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
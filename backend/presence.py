@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "memory" sees only this worker's sockets, so users connected elsewhere look offline;
+# "redis" counts sockets on every worker; "local" lets several PresenceIndex objects in
+# one process share a socket table, to play multiple workers in tests.
+PRESENCE_BACKEND = os.getenv("PRESENCE_BACKEND", "memory").lower()
+PRESENCE_URL = os.getenv("PRESENCE_URL", "")
+# A socket counts as connected for this long after its worker last refreshed it,
+# so sockets of a worker that died without disconnecting them age out
+PRESENCE_TTL = float(os.getenv("PRESENCE_TTL", "60"))
+
+class MemoryPresenceStore:
+    """user -> {sid: expiry} for the sockets of this process"""
+    
+    def __init__(self):
+        self.sockets: Dict[str, Dict[str, float]] = {}
+    
+    def _live(self, user_id: str, now: float) -> int:
+        sids = self.sockets.get(user_id)
+        if sids is None:
+            return 0
+        for sid in [sid for sid, expires in sids.items() if expires <= now]:
+            del sids[sid]
+        if not sids:
+            del self.sockets[user_id]
+        return len(sids)
+    
+    async def add(self, user_id: str, sid: str, ttl: float) -> int:
+        """Record a socket; returns the user's live connections including it"""
+        now = time.time()
+        self.sockets.setdefault(user_id, {})[sid] = now + ttl
+        return self._live(user_id, now)
+    
+    async def remove(self, user_id: str, sid: str, ttl: float) -> int:
+        """Forget a socket; returns the user's live connections left"""
+        self.sockets.get(user_id, {}).pop(sid, None)
+        return self._live(user_id, time.time())
+    
+    async def refresh(self, sockets: Dict[str, Set[str]], ttl: float):
+        """Push the expiry of every socket in `sockets` (user -> sids) out by ttl"""
+        expires = time.time() + ttl
+        for user_id, sids in sockets.items():
+            self.sockets.setdefault(user_id, {}).update(dict.fromkeys(sids, expires))
+    
+    async def counts(self, user_ids: Iterable[str]) -> Dict[str, int]:
+        now = time.time()
+        return {user_id: self._live(user_id, now) for user_id in user_ids}
+    
+    async def close(self):
+        pass
+
+class LocalPresenceStore(MemoryPresenceStore):
+    """One socket table for every PresenceIndex in the process; each index acts as a worker"""
+    _sockets: Dict[str, Dict[str, float]] = {}
+    
+    def __init__(self):
+        self.sockets = self._sockets
+
+class RedisPresenceStore:
+    """One sorted set per user of sid scored by expiry, shared by every worker"""
+    
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+    
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"presence:{user_id}"
+    
+    async def _change(self, user_id: str, sid: str, ttl: float, add: bool) -> int:
+        now = time.time()
+        key = self.key(user_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            if add:
+                pipe.zadd(key, {sid: now + ttl})
+            else:
+                pipe.zrem(key, sid)
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zcard(key)
+            pipe.expire(key, max(1, int(ttl)))
+            return (await pipe.execute())[2]
+    
+    async def add(self, user_id: str, sid: str, ttl: float) -> int:
+        return await self._change(user_id, sid, ttl, add=True)
+    
+    async def remove(self, user_id: str, sid: str, ttl: float) -> int:
+        return await self._change(user_id, sid, ttl, add=False)
+    
+    async def refresh(self, sockets: Dict[str, Set[str]], ttl: float):
+        expires = time.time() + ttl
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, sids in sockets.items():
+                pipe.zadd(self.key(user_id), dict.fromkeys(sids, expires))
+                pipe.expire(self.key(user_id), max(1, int(ttl)))
+            await pipe.execute()
+    
+    async def counts(self, user_ids: Iterable[str]) -> Dict[str, int]:
+        user_ids = list(user_ids)
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.zcount(self.key(user_id), f"({now}", "+inf")
+            return dict(zip(user_ids, await pipe.execute()))
+    
+    async def close(self):
+        await self.client.aclose()
+
+def create_store(kind: str = PRESENCE_BACKEND, url: str = PRESENCE_URL):
+    """Build the socket table selected by PRESENCE_BACKEND"""
+    if kind == "memory":
+        return MemoryPresenceStore()
+    if kind == "local":
+        return LocalPresenceStore()
+    if kind == "redis":
+        return RedisPresenceStore(url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown PRESENCE_BACKEND: {kind}")
+
+class PresenceIndex:
+    """Which users have a socket open, across every worker sharing the store
+    
+    The sid -> user map covers only this process's sockets; connection counts live
+    in the store, and a background task refreshes this process's sockets there every
+    third of PRESENCE_TTL.
+    """
+    
+    def __init__(self, store=None, ttl: float = PRESENCE_TTL):
+        self.store = store or create_store()
+        self.ttl = ttl
+        self.user_sids: Dict[str, Set[str]] = {}
+        self.sid_users: Dict[str, str] = {}
+        self.task: Optional[asyncio.Task] = None
+    
+    async def add(self, user_id: str, sid: str) -> bool:
+        """Register a socket; returns True if the user just came online"""
+        self.sid_users[sid] = user_id
+        self.user_sids.setdefault(user_id, set()).add(sid)
+        try:
+            return await self.store.add(user_id, sid, self.ttl) == 1
+        except Exception as e:
+            logger.warning(f"Presence store unavailable, not announcing {user_id}: {e}")
+            return False
+    
+    async def remove(self, sid: str) -> Tuple[Optional[str], bool]:
+        """Forget a socket; returns (user_id, True if the user just went offline)"""
+        user_id = self.sid_users.pop(sid, None)
+        if user_id is None:
+            return None, False
+        sids = self.user_sids.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self.user_sids[user_id]
+        try:
+            return user_id, await self.store.remove(user_id, sid, self.ttl) == 0
+        except Exception as e:
+            logger.warning(f"Presence store unavailable, not announcing {user_id}: {e}")
+            return user_id, False
+    
+    def user_for(self, sid: str) -> Optional[str]:
+        return self.sid_users.get(sid)
+    
+    async def is_online(self, user_id: str) -> bool:
+        return await self.connections(user_id) > 0
+    
+    async def connections(self, user_id: str) -> int:
+        return (await self.store.counts([user_id]))[user_id]
+    
+    async def online(self, user_ids: List[str]) -> Dict[str, bool]:
+        counts = await self.store.counts(user_ids)
+        return {user_id: counts[user_id] > 0 for user_id in user_ids}
+    
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._heartbeat())
+    
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.store.close()
+    
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.store.refresh(self.user_sids, self.ttl)
+            except Exception as e:
+                logger.warning(f"Presence refresh failed: {e}")
+
+def presence_room(user_id: str) -> str:
+    """Room joined by sockets watching `user_id`'s presence"""
+    return f"presence:{user_id}"
+
+presence = PresenceIndex()
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from auth import decode_token
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# "memory" keeps buckets in this process; "redis" shares them between workers;
+# "local" is a process-wide store with Redis' semantics for tests and benchmarks.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Only behind a proxy that overwrites X-Forwarded-For; otherwise clients pick their own IP
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "").lower() in ("1", "true", "yes")
+
+LOAD_SHED_ENABLED = os.getenv("LOAD_SHED_ENABLED", "true").lower() in ("1", "true", "yes")
+LOAD_SHED_MAX_LAG_MS = float(os.getenv("LOAD_SHED_MAX_LAG_MS", "200"))
+LOAD_SHED_RETRY_AFTER = float(os.getenv("LOAD_SHED_RETRY_AFTER", "2"))
+LOAD_SHED_INTERVAL_MS = float(os.getenv("LOAD_SHED_INTERVAL_MS", "100"))
+
+RATE_LIMITED = registry.counter("rate_limited_total", "Requests rejected by a token bucket", ("policy", "scope"))
+LOAD_SHED = registry.counter("load_shed_total", "Requests rejected because the process was overloaded", ("reason",))
+
+# policy -> scope -> "requests/seconds"; each is overridable as RATE_LIMIT_<POLICY>_<SCOPE>
+# ("off" disables one). A request takes a token from every scope or from none, so a
+# client over its own limit does not spend the per-IP or route-wide budget.
+DEFAULT_POLICIES = {
+    "login": {"ip": "10/60", "route": "30/1"},
+    "register": {"ip": "5/600", "route": "20/1"},
+    "ai": {"user": "30/60", "ip": "60/60", "route": "20/1"},
+    "contact": {"ip": "5/600", "route": "10/1"},
+}
+
+Limit = Tuple[float, float]  # (capacity, tokens refilled per second)
+Bucket = Tuple[str, float, float]  # (key, capacity, tokens refilled per second)
+
+def parse_limit(value: str) -> Optional[Limit]:
+    """"10/60" is a burst of 10 refilled over 60 seconds; "off" or "" is no limit"""
+    value = value.strip().lower()
+    if value in ("", "0", "off", "none"):
+        return None
+    requests, _, seconds = value.partition("/")
+    capacity = float(requests)
+    return capacity, capacity / float(seconds or 1)
+
+def load_policies(defaults: Dict[str, Dict[str, str]] = DEFAULT_POLICIES) -> Dict[str, Dict[str, Limit]]:
+    policies = {}
+    for policy, scopes in defaults.items():
+        policies[policy] = {}
+        for scope, default in scopes.items():
+            limit = parse_limit(os.getenv(f"RATE_LIMIT_{policy.upper()}_{scope.upper()}", default))
+            if limit is not None:
+                policies[policy][scope] = limit
+    return policies
+
+def refill(state: Optional[Tuple[float, float]], capacity: float, rate: float, now: float) -> float:
+    """Tokens in a bucket stored as (tokens, updated) at `now`; a bucket never seen is full"""
+    tokens, updated = state if state is not None else (capacity, now)
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+def spend(states: List[Optional[Tuple[float, float]]], buckets: List[Bucket], now: float) -> Tuple[List[Tuple[float, float]], int, float]:
+    """Token bucket step over several buckets: a token is taken from every one or from none
+    
+    Returns the new (tokens, updated) of each bucket, then -1 and 0, or the index of
+    the first empty bucket and the seconds until it has a token again.
+    """
+    levels = [refill(state, capacity, rate, now) for state, (_, capacity, rate) in zip(states, buckets)]
+    for index, (tokens, (_, _, rate)) in enumerate(zip(levels, buckets)):
+        if tokens < 1:
+            return [(level, now) for level in levels], index, (1 - tokens) / rate
+    return [(level - 1, now) for level in levels], -1, 0.0
+
+class MemoryBackend:
+    """Buckets in a bounded LRU in this process; an evicted key starts over with a full bucket"""
+    
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.buckets: LRUCache = LRUCache(maxsize=max_keys)
+    
+    async def take(self, buckets: List[Bucket]) -> Tuple[int, float]:
+        states, denied, wait = spend([self.buckets.get(key) for key, _, _ in buckets], buckets, time.monotonic())
+        for (key, _, _), state in zip(buckets, states):
+            self.buckets[key] = state
+        return denied, wait
+    
+    async def close(self):
+        pass
+
+class LocalSharedBackend:
+    """Process-wide store shared by every instance, standing in for Redis
+    
+    Several limiters in one process behave like workers sharing one store: state
+    is JSON round-tripped and timed with the wall clock, as it would be remotely.
+    """
+    _store: LRUCache = LRUCache(maxsize=RATE_LIMIT_MAX_KEYS)
+    
+    async def take(self, buckets: List[Bucket]) -> Tuple[int, float]:
+        stored = [self._store.get(key) for key, _, _ in buckets]
+        states, denied, wait = spend([json.loads(state) if state else None for state in stored], buckets, time.time())
+        for (key, _, _), state in zip(buckets, states):
+            self._store[key] = json.dumps(state)
+        return denied, wait
+    
+    async def close(self):
+        pass
+
+# Same step as spend(), run atomically in Redis over every bucket of a request;
+# ARGV holds capacity and rate for each key in turn, and keys expire once they would be full again
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local denied, wait = 0, 0
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    levels[i] = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    if denied == 0 and levels[i] < 1 then
+        denied, wait = i, (1 - levels[i]) / rate
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local tokens = levels[i]
+    if denied == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return {denied - 1, tostring(wait)}
+"""
+
+class RedisBackend:
+    """Buckets shared by every worker, one atomic script call per request"""
+    
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+    
+    async def take(self, buckets: List[Bucket]) -> Tuple[int, float]:
+        keys = [f"ratelimit:{key}" for key, _, _ in buckets]
+        args = [value for _, capacity, rate in buckets for value in (capacity, rate)]
+        denied, wait = await self.script(keys=keys, args=args)
+        return int(denied), float(wait)
+    
+    async def close(self):
+        await self.client.aclose()
+
+def create_backend(kind: str = RATE_LIMIT_BACKEND, url: str = RATE_LIMIT_URL):
+    """Build the bucket store selected by RATE_LIMIT_BACKEND"""
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "local":
+        return LocalSharedBackend()
+    if kind == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind}")
+
+class RateLimiter:
+    """Per-user, per-IP and per-route token buckets for each named policy"""
+    
+    def __init__(self, backend=None, policies: Optional[Dict[str, Dict[str, Limit]]] = None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend or create_backend()
+        self.policies = policies if policies is not None else load_policies()
+        self.enabled = enabled
+        self.counters = {"allowed": 0, "limited": 0, "errors": 0}
+    
+    async def check(self, policy: str, user_id: Optional[str] = None, ip: Optional[str] = None) -> float:
+        """0 if the request may proceed, else seconds to wait; fails open if the store is down"""
+        if not self.enabled:
+            return 0.0
+        identities = {"user": user_id, "ip": ip, "route": ""}
+        scopes, buckets = [], []
+        for scope, (capacity, rate) in self.policies.get(policy, {}).items():
+            identity = identities.get(scope)
+            if identity is not None:
+                scopes.append(scope)
+                buckets.append((f"{policy}:{scope}:{identity}", capacity, rate))
+        if buckets:
+            try:
+                denied, wait = await self.backend.take(buckets)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"Rate limit store unavailable, allowing request: {e}")
+                return 0.0
+            if denied >= 0:
+                self.counters["limited"] += 1
+                RATE_LIMITED.inc(policy=policy, scope=scopes[denied])
+                return wait
+        self.counters["allowed"] += 1
+        return 0.0
+    
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+class LoadShedder:
+    """Rejects expensive work while the event loop lags or a watched queue is too deep
+    
+    Lag is how late a periodic sleep wakes up. It rises at once on a slow tick and
+    halves on each on-time one, so shedding stops soon after the loop recovers.
+    """
+    
+    def __init__(
+        self,
+        max_lag_ms: float = LOAD_SHED_MAX_LAG_MS,
+        retry_after: float = LOAD_SHED_RETRY_AFTER,
+        interval_ms: float = LOAD_SHED_INTERVAL_MS,
+        enabled: bool = LOAD_SHED_ENABLED,
+    ):
+        self.enabled = enabled
+        self.max_lag = max_lag_ms / 1000
+        self.retry_after = retry_after
+        self.interval = interval_ms / 1000
+        self.lag = 0.0
+        self.queues: List[Tuple[str, Callable[[], int], int]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"shed": 0}
+    
+    def watch_queue(self, name: str, depth: Callable[[], int], limit: int):
+        self.queues.append((name, depth, limit))
+    
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._monitor())
+    
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    async def _monitor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            late = max(0.0, loop.time() - started - self.interval)
+            self.lag = max(late, self.lag / 2)
+    
+    def overloaded(self) -> Optional[str]:
+        """The reason to shed a request right now, or None"""
+        if self.max_lag > 0 and self.lag > self.max_lag:
+            return "event_loop_lag"
+        for name, depth, limit in self.queues:
+            if depth() >= limit:
+                return name
+        return None
+    
+    def admit(self) -> float:
+        """0 to admit a request, else the Retry-After to send with a 429"""
+        reason = self.overloaded() if self.enabled else None
+        if reason is None:
+            return 0.0
+        self.counters["shed"] += 1
+        LOAD_SHED.inc(reason=reason)
+        return self.retry_after
+    
+    def stats(self) -> dict:
+        return {**self.counters, "lagMs": round(self.lag * 1000, 3)}
+
+rate_limiter = RateLimiter()
+load_shedder = LoadShedder()
+
+_optional_bearer = HTTPBearer(auto_error=False)
+
+_warned_forwarded = False
+
+def client_ip(request: Request) -> str:
+    global _warned_forwarded
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        if RATE_LIMIT_TRUST_FORWARDED:
+            return forwarded.split(",")[0].strip()
+        if not _warned_forwarded:
+            _warned_forwarded = True
+            logger.warning(
+                "X-Forwarded-For received but RATE_LIMIT_TRUST_FORWARDED is off; "
+                "per-IP limits use the proxy's address. Enable it if the proxy overwrites the header."
+            )
+    return request.client.host if request.client else "unknown"
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+def rate_limit(policy: str):
+    """Route dependency: shed under overload, then spend the policy's buckets for this caller"""
+    
+    async def dependency(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(_optional_bearer)):
+        retry_after = load_shedder.admit()
+        if retry_after:
+            raise too_many_requests(retry_after)
+        
+        user_id = None
+        if credentials is not None:
+            try:
+                user_id = decode_token(credentials.credentials).get("sub")
+            except HTTPException:
+                pass  # the route's own auth dependency rejects it
+        retry_after = await rate_limiter.check(policy, user_id=user_id, ip=client_ip(request))
+        if retry_after:
+            raise too_many_requests(retry_after)
+    
+    return dependency
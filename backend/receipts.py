@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+READ_RECEIPT_WINDOW_MS = float(os.getenv("READ_RECEIPT_WINDOW_MS", "500"))
+TYPING_THROTTLE_MS = float(os.getenv("TYPING_THROTTLE_MS", "2000"))
+
+ReceiptKey = Tuple[str, str]  # (userId, conversationId)
+
+class ReadReceiptCoalescer:
+    """Collapse a burst of read receipts per (user, conversation) into one write
+    
+    A chat window marks messages read as each one arrives. The first receipt for a
+    key opens a window; later ones in that window only move the high-water mark, and
+    `flush(user_id, conversation_id, up_to)` runs once when it closes.
+    """
+    
+    def __init__(
+        self,
+        flush: Callable[[str, str, datetime], Awaitable[None]],
+        window: float = READ_RECEIPT_WINDOW_MS / 1000,
+    ):
+        self.flush = flush
+        self.window = window
+        self.pending: Dict[ReceiptKey, datetime] = {}
+        self.tasks: Dict[ReceiptKey, asyncio.Task] = {}
+        self.counters = {"received": 0, "flushed": 0, "errors": 0}
+    
+    def mark(self, user_id: str, conversation_id: str, up_to: datetime):
+        key = (user_id, conversation_id)
+        self.counters["received"] += 1
+        current = self.pending.get(key)
+        self.pending[key] = up_to if current is None else max(current, up_to)
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.create_task(self._flush_later(key))
+    
+    async def _flush_later(self, key: ReceiptKey):
+        try:
+            await asyncio.sleep(self.window)
+        except asyncio.CancelledError:
+            pass  # stop() flushes immediately
+        self.tasks.pop(key, None)
+        up_to = self.pending.pop(key, None)
+        if up_to is None:
+            return
+        try:
+            await self.flush(key[0], key[1], up_to)
+            self.counters["flushed"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Read receipt flush failed for {key}: {e}")
+    
+    async def stop(self):
+        """Flush every open window now"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks)
+    
+    def stats(self) -> dict:
+        return {**self.counters, "pending": len(self.pending)}
+
+class TypingThrottle:
+    """Forward "typing" at most once per interval per (socket, target); "stopped" only after a forwarded start"""
+    
+    def __init__(self, interval: float = TYPING_THROTTLE_MS / 1000):
+        self.interval = interval
+        self.last_sent: Dict[str, Dict[str, float]] = {}
+    
+    def should_forward(self, sid: str, target: str, typing: bool) -> bool:
+        targets = self.last_sent.setdefault(sid, {})
+        if not typing:
+            return targets.pop(target, None) is not None
+        now = time.monotonic()
+        last = targets.get(target)
+        if last is not None and now - last < self.interval:
+            return False
+        targets[target] = now
+        return True
+    
+    def clear(self, sid: str, target: str):
+        self.last_sent.get(sid, {}).pop(target, None)
+    
+    def forget(self, sid: str):
+        self.last_sent.pop(sid, None)
@@ -0,0 +1,64 @@
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, List, Optional, Tuple
+from cachetools import LRUCache
+
+RESUME_BUFFER_SIZE = int(os.getenv("RESUME_BUFFER_SIZE", "200"))
+RESUME_BUFFER_USERS = int(os.getenv("RESUME_BUFFER_USERS", "20000"))
+# A missing seq older than this is taken as lost rather than still in the write pipeline
+RESUME_GAP_GRACE_SECONDS = float(os.getenv("RESUME_GAP_GRACE_SECONDS", "30"))
+
+def contiguous(
+    after_seq: int, messages: List[dict], grace: float = RESUME_GAP_GRACE_SECONDS
+) -> Tuple[List[dict], int]:
+    """The run of seq-ordered stored `messages` a client can take, and the seq it ends at
+    
+    A seq is reserved before its message is written, so a hole may be a message
+    still queued here or on another worker: stop before it, so the client's cursor
+    never passes a message it has not received. A hole followed by a message older
+    than `grace` is a write that never happened and is skipped.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    taken, cursor = [], after_seq
+    for message in messages:
+        if message["seq"] != cursor + 1 and message["createdAt"] > cutoff:
+            break
+        taken.append(message)
+        cursor = message["seq"]
+    return taken, cursor
+
+class ReplayBuffer:
+    """Recent messages per user, so a reconnecting client can be caught up from memory
+    
+    Each user keeps the last `size` messages they sent or received, across all of
+    their conversations; only the `users` most recently active users are kept.
+    The buffer only sees messages delivered by this process, so callers check a
+    replay against the conversation's lastSeq and fall back to Mongo on any gap.
+    """
+    
+    def __init__(self, size: int = RESUME_BUFFER_SIZE, users: int = RESUME_BUFFER_USERS):
+        self.size = size
+        self.buffers: LRUCache = LRUCache(maxsize=users)
+        self.counters = {"hits": 0, "misses": 0}
+    
+    def record(self, user_id: str, message: dict):
+        buffer: Optional[Deque[dict]] = self.buffers.get(user_id)
+        if buffer is None:
+            buffer = self.buffers[user_id] = deque(maxlen=self.size)
+        buffer.append(message)
+    
+    def gap(self, user_id: str, conversation_id: str, after_seq: int, last_seq: int) -> Optional[List[dict]]:
+        """Messages with after_seq < seq <= last_seq, or None unless every one of them is buffered"""
+        buffer = self.buffers.get(user_id) or ()
+        found = {m["seq"]: m for m in buffer if m["conversationId"] == conversation_id and after_seq < m["seq"] <= last_seq}
+        if len(found) != last_seq - after_seq:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return [found[seq] for seq in range(after_seq + 1, last_seq + 1)]
+    
+    def stats(self) -> dict:
+        return {**self.counters, "users": len(self.buffers)}
+
+replay_buffer = ReplayBuffer()
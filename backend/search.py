@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import heapq
+import os
+import re
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from pymongo import UpdateOne
+from database import mongo
+from matching import normalize_skill
+
+
+# Fields needed to index a user for search; use as a Mongo projection when loading
+SEARCH_FIELDS = {"_id": 0, "id": 1, "name": 1, "skillsToTeach": 1}
+
+NAME_WEIGHT = 2.0
+SKILL_WEIGHT = 3.0
+EXACT_BONUS = 2.0
+MAX_PREFIX_EXPANSION = 500
+MAX_TERMS = 5
+# Postings a search walks before ranking what it has; bounds the work done on the event loop
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[+#.][^\W_]*)*", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; keeps skills like 'c++', 'c#' and 'node.js' intact"""
+    return _TOKEN_RE.findall((text or "").lower())
+
+def search_tokens(user: dict) -> List[str]:
+    """Normalized tokens stored on the user document as `searchTokens`"""
+    tokens = set(tokenize(user.get("name", "")))
+    for skill in user.get("skillsToTeach") or []:
+        tokens.update(tokenize(skill))
+    return sorted(tokens)
+
+def mongo_prefix_query(terms: List[str]) -> dict:
+    """Index-backed filter: anchored, case-sensitive regexes over lowercased tokens"""
+    return {"$and": [{"searchTokens": re.compile("^" + re.escape(term))} for term in terms]}
+
+class _TrieNode:
+    __slots__ = ("children", "count")
+    
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.count = 0  # users holding exactly this token
+
+def _tail(items: List[str], start: int) -> Iterator[str]:
+    """items[start:] without copying the list"""
+    return (items[i] for i in range(start, len(items)))
+
+class SearchIndex:
+    """In-memory token trie with weighted postings for ranked user search and autocomplete
+    
+    Each token's postings are kept as one id-sorted list per weight. Weights take
+    a few fixed values, so a term's matches fall into a few score tiers that can be
+    walked best-first in (-score, id) order without scoring every posting.
+    """
+    
+    def __init__(self, max_candidates: int = SEARCH_MAX_CANDIDATES):
+        self.root = _TrieNode()
+        self.max_candidates = max_candidates
+        self.postings: Dict[str, Dict[float, List[str]]] = {}
+        self.user_tokens: Dict[str, Dict[str, float]] = {}
+        self.user_skills: Dict[str, Set[str]] = {}
+        self.ready = False
+    
+    def __len__(self) -> int:
+        return len(self.user_tokens)
+    
+    def load(self, users: Iterable[dict]):
+        """Index many users, sorting each posting list once instead of inserting in order"""
+        again = []
+        for user in users:
+            if user["id"] in self.user_tokens:
+                again.append(user)  # replaced once the lists are sorted
+            else:
+                self._add(user, list.append)
+        for postings in self.postings.values():
+            for user_ids in postings.values():
+                user_ids.sort()
+        for user in again:
+            self.upsert(user)
+    
+    def upsert(self, user: dict):
+        self.remove(user["id"])
+        self._add(user, insort)
+    
+    def _add(self, user: dict, add: Callable[[List[str], str], None]):
+        weights: Dict[str, float] = {}
+        for token in tokenize(user.get("name", "")):
+            weights[token] = max(weights.get(token, 0.0), NAME_WEIGHT)
+        for skill in user.get("skillsToTeach") or []:
+            for token in tokenize(skill):
+                weights[token] = max(weights.get(token, 0.0), SKILL_WEIGHT)
+        
+        self.user_tokens[user["id"]] = weights
+        self.user_skills[user["id"]] = {normalize_skill(s) for s in user.get("skillsToTeach") or []}
+        for token, weight in weights.items():
+            add(self.postings.setdefault(token, {}).setdefault(weight, []), user["id"])
+            self._node(token, create=True).count += 1
+    
+    def remove(self, user_id: str):
+        weights = self.user_tokens.pop(user_id, None)
+        self.user_skills.pop(user_id, None)
+        if not weights:
+            return
+        for token, weight in weights.items():
+            postings = self.postings[token]
+            user_ids = postings[weight]
+            del user_ids[bisect_left(user_ids, user_id)]
+            if not user_ids:
+                del postings[weight]
+                if not postings:
+                    del self.postings[token]
+            self._node(token).count -= 1
+    
+    def _node(self, prefix: str, create: bool = False) -> Optional[_TrieNode]:
+        node = self.root
+        for char in prefix:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = _TrieNode()
+            node = child
+        return node
+    
+    def _expand(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Tokens starting with `prefix` as (token, user count), most common first"""
+        start = self._node(prefix)
+        if start is None:
+            return []
+        found = []
+        stack = [(prefix, start)]
+        while stack:
+            token, node = stack.pop()
+            if node.count > 0:
+                found.append((token, node.count))
+            stack.extend((token + char, child) for char, child in node.children.items())
+        return heapq.nlargest(limit, found, key=lambda item: item[1])
+    
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[str]:
+        terms = tokenize(prefix)
+        if not terms:
+            return []
+        return [token for token, _ in self._expand(terms[-1], limit)]
+    
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        after: Optional[Tuple[float, str]] = None,
+        skill: Optional[str] = None,
+        exclude: Iterable[str] = (),
+    ) -> List[Tuple[str, float]]:
+        """Rank users matching every query term (as a prefix), ordered by (-score, id)
+        
+        `after` is the (score, id) of the last result of the previous page. Single-term
+        results are exact; with several terms only the first max_candidates postings
+        of the rarest term are considered, best first.
+        """
+        terms = tokenize(query)[:MAX_TERMS]
+        if not terms:
+            return []
+        expansions = [self._bonuses(term) for term in terms]
+        if not all(expansions):
+            return []
+        
+        # Drive from the term with the fewest postings and check the others per candidate
+        driver = min(range(len(terms)), key=lambda i: self._posting_count(expansions[i]))
+        others = [bonuses for i, bonuses in enumerate(expansions) if i != driver]
+        best_others = sum(self._best_score(bonuses) for bonuses in others)
+        excluded = set(exclude)
+        wanted_skill = normalize_skill(skill) if skill else None
+        
+        # Nothing left in the walk can score above `bound`, and ties there lose on id,
+        # so the page is final once `limit` results are known to beat what remains
+        ranked: List[Tuple[float, str]] = []
+        bound, beaten = None, 0
+        walk = self._walk(expansions[driver], None if others else after)
+        for scanned, (tier_score, user_id) in enumerate(walk):
+            if tier_score + best_others != bound:
+                bound = tier_score + best_others
+                beaten = sum(1 for neg_score, _ in ranked if -neg_score > bound)
+            if scanned >= self.max_candidates or beaten >= limit:
+                break
+            tokens = self.user_tokens[user_id]
+            if self._term_score(tokens, expansions[driver]) != tier_score:
+                continue  # listed again under a better tier, where it was already taken
+            if user_id in excluded or (wanted_skill is not None and wanted_skill not in self.user_skills[user_id]):
+                continue
+            score = tier_score
+            for bonuses in others:
+                term_score = self._term_score(tokens, bonuses)
+                if not term_score:
+                    break
+                score += term_score
+            else:
+                if after is None or (-score, user_id) > (-after[0], after[1]):
+                    ranked.append((-score, user_id))
+                    if score == bound:
+                        beaten += 1
+        return [(user_id, -neg_score) for neg_score, user_id in heapq.nsmallest(limit, ranked)]
+    
+    def _bonuses(self, term: str) -> Dict[str, float]:
+        """Indexed tokens `term` matches as a prefix, with the score multiplier of each"""
+        bonuses = {token: 1.0 for token, _ in self._expand(term, MAX_PREFIX_EXPANSION)}
+        if term in self.postings:
+            bonuses[term] = EXACT_BONUS
+        return bonuses
+    
+    def _posting_count(self, bonuses: Dict[str, float]) -> int:
+        return sum(len(user_ids) for token in bonuses for user_ids in self.postings[token].values())
+    
+    def _best_score(self, bonuses: Dict[str, float]) -> float:
+        return max(max(self.postings[token]) * bonus for token, bonus in bonuses.items())
+    
+    @staticmethod
+    def _term_score(tokens: Dict[str, float], bonuses: Dict[str, float]) -> float:
+        """A user's score on one term: their best-weighted matching token"""
+        best = 0.0
+        for token, weight in tokens.items():
+            bonus = bonuses.get(token)
+            if bonus is not None and weight * bonus > best:
+                best = weight * bonus
+        return best
+    
+    def _walk(self, bonuses: Dict[str, float], after: Optional[Tuple[float, str]] = None) -> Iterator[Tuple[float, str]]:
+        """(score, user_id) for every posting of the term's tokens, in (-score, id) order
+        
+        A user holding several matching tokens is listed once per tier they appear
+        in. `after` skips to the postings following that (score, id).
+        """
+        tiers: Dict[float, List[List[str]]] = {}
+        for token, bonus in bonuses.items():
+            for weight, user_ids in self.postings[token].items():
+                tiers.setdefault(weight * bonus, []).append(user_ids)
+        for score in sorted(tiers, reverse=True):
+            if after is not None and score > after[0]:
+                continue
+            lists = tiers[score]
+            if after is not None and score == after[0]:
+                lists = [_tail(user_ids, bisect_right(user_ids, after[1])) for user_ids in lists]
+            previous = None
+            for user_id in heapq.merge(*lists):
+                if user_id != previous:
+                    previous = user_id
+                    yield score, user_id
+
+search_index = SearchIndex()
+
+async def backfill_search_tokens(db, batch_size: int = 1000) -> int:
+    """Recompute `searchTokens` for every user document"""
+    operations = []
+    updated = 0
+    async for user in db.users.find({}, SEARCH_FIELDS):
+        operations.append(UpdateOne({"id": user["id"]}, {"$set": {"searchTokens": search_tokens(user)}}))
+        if len(operations) >= batch_size:
+            await db.users.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+async def main():
+    db = mongo.db
+    
+    updated = await backfill_search_tokens(db)
+    print(f"✓ Recomputed search tokens for {updated} users")
+    
+    mongo.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill searchTokens on user documents")
+    parser.parse_args()
+    asyncio.run(main())
@@ -1,18 +1,29 @@
+"""Seed the database with demo users, or with a reproducible synthetic dataset.
+
+Usage: python seed_data.py                                   # five demo users
+       python seed_data.py --users 1000000 [--conversations-per-user 3]
+                           [--messages-per-conversation 10] [--seed 42] [--drop]
+                           [--batch-size 5000] [--concurrency 8] [--workers 4]
+"""
+import argparse
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
 import os
-from pathlib import Path
-from models import User
+import random
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from database import mongo
+from models import User, conversation_pair_key
 from auth import get_password_hash
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from indexes import ensure_indexes
+from inbox import InboxUpdate, inbox_operations
+from search import search_tokens
 
 async def seed_database():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
+    db = mongo.db
     
     # Check if users already exist
     count = await db.users.count_documents({})
@@ -20,12 +31,15 @@ async def seed_database():
         print(f"Database already has {count} users. Skipping seed.")
         return
     
+    # bcrypt is deliberately slow, so hash the shared demo password once
+    password = get_password_hash("password123")
+    
     # Create demo users
     demo_users = [
         User(
             name="Sarah Miller",
             email="sarah@example.com",
-            password=get_password_hash("password123"),
+            password=password,
             avatar="https://randomuser.me/api/portraits/women/44.jpg",
             bio="Food blogger and photography enthusiast with a passion for culinary arts",
             location="New York, NY",
@@ -37,7 +51,7 @@ async def seed_database():
         User(
             name="Michael Chen",
             email="michael@example.com",
-            password=get_password_hash("password123"),
+            password=password,
             avatar="https://randomuser.me/api/portraits/men/75.jpg",
             bio="Freelance designer and creative thinker specializing in UI/UX",
             location="Austin, TX",
@@ -49,7 +63,7 @@ async def seed_database():
         User(
             name="Emma Davis",
             email="emma@example.com",
-            password=get_password_hash("password123"),
+            password=password,
             avatar="https://randomuser.me/api/portraits/women/65.jpg",
             bio="Yoga instructor and wellness coach helping people find balance",
             location="Los Angeles, CA",
@@ -61,7 +75,7 @@ async def seed_database():
         User(
             name="David Wilson",
             email="david@example.com",
-            password=get_password_hash("password123"),
+            password=password,
             avatar="https://randomuser.me/api/portraits/men/22.jpg",
             bio="Professional photographer and travel blogger capturing moments",
             location="Seattle, WA",
@@ -73,7 +87,7 @@ async def seed_database():
         User(
             name="Jessica Lee",
             email="jessica@example.com",
-            password=get_password_hash("password123"),
+            password=password,
             avatar="https://randomuser.me/api/portraits/women/32.jpg",
             bio="Marketing expert and social media strategist",
             location="Chicago, IL",
@@ -84,14 +98,324 @@ async def seed_database():
         )
     ]
     
-    for user in demo_users:
-        await db.users.insert_one(user.dict())
+    users = [user.dict() for user in demo_users]
+    for user in users:
+        user["searchTokens"] = search_tokens(user)
+    await db.users.insert_many(users)
     
     print(f"✓ Seeded database with {len(demo_users)} demo users")
     print("  Email: sarah@example.com / michael@example.com / emma@example.com")
     print("  Password: password123")
     
-    client.close()
+    mongo.close()
+
+# ============= Synthetic Dataset =============
+
+# Most popular first; popularity falls off Zipf-like so a few skills dominate
+SKILLS = [
+    "Web Development", "Photography", "Spanish", "Guitar", "Cooking", "Python", "Yoga",
+    "Digital Marketing", "Graphic Design", "Piano", "French", "Video Editing", "SEO",
+    "UI/UX Design", "Public Speaking", "Data Science", "Baking", "Drawing", "JavaScript",
+    "Meditation", "Writing", "Excel", "Social Media", "Machine Learning", "Japanese",
+    "Figma", "Illustration", "Nutrition", "Fitness Training", "German", "React",
+    "Content Writing", "Singing", "Chess", "Mandarin", "Lightroom", "Animation",
+    "Project Management", "Node.js", "Gardening", "Knitting", "Travel Planning",
+    "Food Photography", "3D Modeling", "Motion Graphics", "Italian", "Dancing", "C++",
+    "Swimming", "Calligraphy", "Pottery", "Woodworking", "Sign Language", "Podcasting",
+    "Film Making", "Interior Design", "Personal Finance", "Sewing", "Rock Climbing",
+    "Surfing", "Skateboarding", "Drums", "Violin", "Ukulele", "Portuguese", "Korean",
+    "Arabic", "Blender", "Unity", "Go", "Rust", "SQL", "Copywriting", "Branding",
+    "Negotiation", "Leadership", "Resume Writing", "Makeup", "Hair Styling", "Pilates",
+    "Running", "Cycling", "Bartending", "Wine Tasting", "Astronomy", "Bird Watching",
+    "Origami", "Magic Tricks", "Stand-up Comedy", "Acting", "Poetry", "Journaling",
+    "Beekeeping", "Fermentation", "Bread Making", "Cake Decorating", "Home Repair",
+    "Car Maintenance", "First Aid", "Self Defense",
+]
+SKILL_WEIGHTS = [1.0 / (rank + 1) for rank in range(len(SKILLS))]
+SKILL_COUNTS, SKILL_COUNT_WEIGHTS = [1, 2, 3, 4, 5], [2, 4, 4, 2, 1]
+
+FIRST_NAMES = {
+    "women": ["Sarah", "Emma", "Jessica", "Olivia", "Ava", "Sophia", "Mia", "Isabella",
+              "Priya", "Mei", "Fatima", "Lucia", "Hannah", "Chloe", "Aisha", "Yuki"],
+    "men": ["Michael", "David", "James", "Daniel", "Lucas", "Ethan", "Noah", "Liam",
+            "Arjun", "Wei", "Omar", "Mateo", "Samuel", "Jack", "Kofi", "Hiro"],
+}
+LAST_NAMES = [
+    "Miller", "Chen", "Davis", "Wilson", "Lee", "Smith", "Johnson", "Garcia", "Martinez",
+    "Brown", "Nguyen", "Patel", "Kim", "Singh", "Lopez", "Clark", "Khan", "Tanaka",
+    "Rossi", "Müller", "Silva", "Okafor", "Cohen", "Novak",
+]
+LOCATIONS = [
+    "New York, NY", "Los Angeles, CA", "Chicago, IL", "Austin, TX", "Seattle, WA",
+    "San Francisco, CA", "Boston, MA", "Denver, CO", "Miami, FL", "Atlanta, GA",
+    "Portland, OR", "London, UK", "Toronto, ON", "Berlin, DE", "Bangalore, IN", "",
+]
+LOCATION_WEIGHTS = [8, 6, 5, 4, 4, 4, 3, 3, 3, 3, 2, 3, 2, 2, 3, 6]
+BIO_TEMPLATES = [
+    "Passionate about {teach} and eager to pick up {learn}",
+    "{teach} enthusiast looking to swap lessons for {learn}",
+    "I have taught {teach} for years; now I want to learn {learn}",
+    "Happy to share what I know about {teach}. Curious about {learn}",
+]
+MESSAGE_TEMPLATES = [
+    "Hi! I'd love to learn {skill} from you.",
+    "Would you be up for a {skill} session this week?",
+    "Thanks for the {skill} tips, that really helped!",
+    "I can help you with {skill} in exchange.",
+    "Does Saturday morning work for {skill}?",
+    "Sounds great, see you then!",
+    "Could you share some resources on {skill}?",
+    "How long have you been doing {skill}?",
+]
+
+# Fixed origin so the same seed always produces identical documents
+EPOCH = datetime(2025, 1, 1)
+HISTORY_SECONDS = 365 * 24 * 3600
+SEED_NAMESPACE = uuid.UUID("6f1c0a52-3b7e-4d8e-9c59-2a4f8e0d1b37")
+
+def synthetic_user_id(seed: int, index: int) -> str:
+    return str(uuid.uuid5(SEED_NAMESPACE, f"{seed}:user:{index}"))
+
+def _pick_skills(rng: random.Random, exclude=()) -> List[str]:
+    k = rng.choices(SKILL_COUNTS, SKILL_COUNT_WEIGHTS)[0]
+    skills = []
+    for skill in rng.choices(SKILLS, SKILL_WEIGHTS, k=k * 2):
+        if skill not in skills and skill not in exclude:
+            skills.append(skill)
+    return skills[:k]
+
+def _timestamp(rng: random.Random) -> datetime:
+    # Whole milliseconds, the precision Mongo stores
+    return EPOCH + timedelta(milliseconds=rng.randrange(HISTORY_SECONDS * 1000))
+
+def synthetic_identity(seed: int, index: int) -> Tuple[random.Random, dict]:
+    """The user's id, name and avatar, plus the RNG positioned to generate the rest"""
+    rng = random.Random(f"{seed}:user:{index}")
+    gender = rng.choice(["women", "men"])
+    identity = {
+        "id": synthetic_user_id(seed, index),
+        "name": f"{rng.choice(FIRST_NAMES[gender])} {rng.choice(LAST_NAMES)}",
+        "avatar": f"https://randomuser.me/api/portraits/{gender}/{rng.randrange(100)}.jpg",
+    }
+    return rng, identity
+
+def synthetic_user(seed: int, index: int, password_hash: str) -> dict:
+    """User document `index` of the dataset; mirrors the `User` model"""
+    rng, user = synthetic_identity(seed, index)
+    teach = _pick_skills(rng)
+    learn = _pick_skills(rng, exclude=teach)
+    created = _timestamp(rng)
+    user.update({
+        "email": f"user{index}@example.com",
+        "password": password_hash,
+        "bio": rng.choice(BIO_TEMPLATES).format(teach=teach[0], learn=learn[0] if learn else "something new"),
+        "location": rng.choices(LOCATIONS, LOCATION_WEIGHTS)[0],
+        "skillsToTeach": teach,
+        "skillsToLearn": learn,
+        "rating": round(min(5.0, rng.triangular(3.0, 5.0, 4.7)), 1),
+        "completedExchanges": int(rng.expovariate(1 / 8)),
+        "createdAt": created,
+        "updatedAt": created,
+    })
+    user["searchTokens"] = search_tokens(user)
+    return user
+
+def synthetic_conversations(
+    seed: int, users: int, index: int, per_user: int, messages_per_conversation: int
+) -> Tuple[List[dict], List[dict], List[InboxUpdate]]:
+    """Conversations started by user `index`, with their messages and inbox entries.
+    
+    Partners sit at distinct offsets in [1, (users - 1) // 2] around the ring of
+    user indexes, so every unordered pair is generated at most once.
+    """
+    rng = random.Random(f"{seed}:conversations:{index}")
+    max_offset = (users - 1) // 2
+    offsets = rng.sample(range(1, max_offset + 1), min(per_user, max_offset)) if max_offset else []
+    
+    _, me = synthetic_identity(seed, index)
+    conversations, messages, inbox_updates = [], [], []
+    for offset in offsets:
+        _, other = synthetic_identity(seed, (index + offset) % users)
+        conversation_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        created = _timestamp(rng)
+    
+        count = rng.randint(1, max(1, 2 * messages_per_conversation - 1))
+        unread_tail = rng.randint(0, min(3, count))
+        sent_at = created
+        unread = {me["id"]: 0, other["id"]: 0}
+        for position in range(count):
+            sender, receiver = (me, other) if rng.random() < 0.5 else (other, me)
+            sent_at += timedelta(milliseconds=int(rng.expovariate(1 / 600) * 1000) + 1)
+            read = position < count - unread_tail
+            if not read:
+                unread[receiver["id"]] += 1
+            messages.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "conversationId": conversation_id,
+                "senderId": sender["id"],
+                "receiverId": receiver["id"],
+                "message": rng.choice(MESSAGE_TEMPLATES).format(skill=rng.choice(SKILLS)),
+                "read": read,
+                "seq": position + 1,
+                "createdAt": sent_at,
+            })
+    
+        last_message = messages[-1]["message"]
+        conversations.append({
+            "id": conversation_id,
+            "participants": [me["id"], other["id"]],
+            "pairKey": conversation_pair_key(me["id"], other["id"]),
+            "lastMessage": last_message,
+            "lastMessageTime": sent_at,
+            "lastSeq": count,
+            "createdAt": created,
+        })
+        for user, counterpart in ((me, other), (other, me)):
+            inbox_updates.append((user["id"], conversation_id, {
+                "id": conversation_id,
+                "participantId": counterpart["id"],
+                "participantName": counterpart["name"],
+                "participantAvatar": counterpart["avatar"],
+                "lastMessage": last_message,
+                "lastMessageTime": sent_at,
+            }, unread[user["id"]]))
+    return conversations, messages, inbox_updates
+
+def synthetic_batch(
+    seed: int, users: int, start: int, stop: int, password_hash: str,
+    per_user: int, messages_per_conversation: int
+) -> Dict[str, list]:
+    """Documents for users [start, stop) and the conversations they start; runs in worker processes"""
+    batch = {"users": [], "conversations": [], "messages": [], "inboxes": []}
+    for index in range(start, stop):
+        batch["users"].append(synthetic_user(seed, index, password_hash))
+        if per_user:
+            conversations, messages, inbox_updates = synthetic_conversations(
+                seed, users, index, per_user, messages_per_conversation
+            )
+            batch["conversations"].extend(conversations)
+            batch["messages"].extend(messages)
+            batch["inboxes"].extend(inbox_updates)
+    return batch
+
+class BulkLoader:
+    """Writes generated batches with unordered insert_many, `concurrency` batches at a time"""
+    
+    def __init__(self, db, concurrency: int):
+        self.db = db
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+        self.errors: List[Exception] = []
+        self.counts = {"users": 0, "conversations": 0, "messages": 0}
+    
+    async def _write(self, batch: Dict[str, list]):
+        try:
+            writes = [
+                self.db[name].insert_many(batch[name], ordered=False)
+                for name in ("users", "conversations", "messages") if batch[name]
+            ]
+            if batch["inboxes"]:
+                writes.append(self.db.inboxes.bulk_write(inbox_operations(batch["inboxes"]), ordered=True))
+            await asyncio.gather(*writes)
+            for name in self.counts:
+                self.counts[name] += len(batch[name])
+        except Exception as e:
+            self.errors.append(e)  # raised by drain(), or by the next write
+        finally:
+            self.slots.release()
+    
+    async def write(self, batch: Dict[str, list]):
+        if self.errors:
+            await self.drain()
+        await self.slots.acquire()
+        task = asyncio.create_task(self._write(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    async def drain(self):
+        """Wait for every batch in flight; raises the first write that failed"""
+        await asyncio.gather(*self.tasks)
+        if self.errors:
+            raise self.errors[0]
+
+async def seed_synthetic(
+    db, users: int, per_user: int = 3, messages_per_conversation: int = 10, seed: int = 42,
+    batch_size: int = 5000, concurrency: int = 8, workers: int = 0, password: str = "password123"
+) -> Dict[str, int]:
+    """Generate and insert a seeded dataset of `users` users; returns document counts"""
+    password_hash = get_password_hash(password)
+    await ensure_indexes(db)
+    loader = BulkLoader(db, concurrency)
+    ranges = [(start, min(users, start + batch_size)) for start in range(0, users, batch_size)]
+    
+    def report(done: int):
+        if done % 10 == 0 or done == len(ranges):
+            print(f"  {min(done * batch_size, users)}/{users} users generated")
+    
+    if workers > 0:
+        # Generation is CPU-bound; keep a few batches in flight per worker process
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            for done, (start, stop) in enumerate(ranges, 1):
+                pending.append(loop.run_in_executor(
+                    pool, synthetic_batch, seed, users, start, stop, password_hash,
+                    per_user, messages_per_conversation
+                ))
+                if len(pending) >= workers * 2:
+                    await loader.write(await pending.popleft())
+                report(done)
+            while pending:
+                await loader.write(await pending.popleft())
+    else:
+        for done, (start, stop) in enumerate(ranges, 1):
+            await loader.write(synthetic_batch(
+                seed, users, start, stop, password_hash, per_user, messages_per_conversation
+            ))
+            report(done)
+    
+    await loader.drain()
+    # Every conversation was written through its inbox entries
+    await db.inboxes.update_many({}, {"$set": {"complete": True}})
+    return loader.counts
+
+async def main(args):
+    db = mongo.db
+    
+    if args.drop:
+        for name in ("users", "conversations", "messages", "inboxes", "match_recommendations"):
+            await db[name].drop()
+    
+    if not args.users:
+        await seed_database()
+        return
+    
+    count = await db.users.count_documents({})
+    if count > 0:
+        print(f"Database already has {count} users. Use --drop to replace them.")
+        mongo.close()
+        return
+    
+    started = time.perf_counter()
+    counts = await seed_synthetic(
+        db, args.users, args.conversations_per_user, args.messages_per_conversation, args.seed,
+        args.batch_size, args.concurrency, args.workers
+    )
+    elapsed = time.perf_counter() - started
+    print(f"✓ Seeded {counts['users']} users, {counts['conversations']} conversations and "
+          f"{counts['messages']} messages in {elapsed:.1f}s (seed {args.seed})")
+    print("  Email: user0@example.com ... / Password: password123")
+    
+    mongo.close()
 
 if __name__ == "__main__":
-    asyncio.run(seed_database())
+    parser = argparse.ArgumentParser(description="Seed demo users or a synthetic load-test dataset")
+    parser.add_argument("--users", type=int, default=0, help="synthetic users to generate (0 seeds the demo users)")
+    parser.add_argument("--conversations-per-user", type=int, default=3, help="conversations each user starts")
+    parser.add_argument("--messages-per-conversation", type=int, default=10, help="average messages per conversation")
+    parser.add_argument("--seed", type=int, default=42, help="same seed, same dataset")
+    parser.add_argument("--batch-size", type=int, default=5000, help="users per insert batch")
+    parser.add_argument("--concurrency", type=int, default=8, help="batches written in parallel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="generator processes (0 = in-process)")
+    parser.add_argument("--drop", action="store_true", help="drop existing data first")
+    asyncio.run(main(parser.parse_args()))
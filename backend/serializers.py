@@ -0,0 +1,21 @@
+from typing import Any, List
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from models import UserResponse
+
+# Projection matching UserResponse; keeps password hashes and timestamps off the wire
+USER_RESPONSE_FIELDS = {"_id": 0, **{field: 1 for field in UserResponse.model_fields}}
+
+# Built once; validation and JSON encoding both run in pydantic-core
+user_list_adapter = TypeAdapter(List[UserResponse])
+
+def users_to_response(users: List[dict]) -> List[UserResponse]:
+    """Apply UserResponse defaults to projected user documents"""
+    return user_list_adapter.validate_python(users)
+
+class FastJSONResponse(JSONResponse):
+    """Encodes content with pydantic-core directly, skipping jsonable_encoder's copy"""
+    
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -1,43 +1,97 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
 import socketio
 import os
+import json
+import uuid
+import asyncio
+import functools
+import math
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from datetime import datetime
-from typing import List, Optional
+from urllib.parse import parse_qs
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from pydantic import ValidationError
 
 # Import models and services
 from models import (
-    User, UserCreate, UserLogin, UserUpdate, UserResponse,
-    Message, MessageCreate, Conversation,
+    User, UserCreate, UserLogin, UserUpdate,
+    Message, MessageCreate, ResumeRequest, Conversation, conversation_pair_key,
     Contact, ContactCreate,
-    AIMatchRequest, AIEnhanceRequest, AIChatRequest
+    AIEnhanceRequest, AIChatRequest
 )
 from auth import (
-    get_password_hash, verify_password, create_access_token, get_current_user
+    hash_password_async, verify_password_async, create_access_token, decode_token, get_current_user,
+    hash_queue_depth
 )
 from ai_service import ai_service
+from database import mongo, db
+from pagination import encode_cursor, decode_cursor, keyset_filter, encode_rank_cursor, decode_rank_cursor
+from indexes import ensure_indexes
+from matching import match_index, MATCH_FIELDS
+from vector_matching import get_precomputed_recommendations
+from ai_cache import AI_CACHE_MONGO
+from user_cache import user_cache, USER_DOC_FIELDS
+from realtime import InstrumentedAsyncServer, create_client_manager
+from presence import presence, presence_room
+from message_writer import message_writer
+from receipts import ReadReceiptCoalescer, TypingThrottle
+from replay import contiguous, replay_buffer
+from skill_suggestions import skill_associations, user_skills
+from serializers import FastJSONResponse, USER_RESPONSE_FIELDS, users_to_response
+from inbox import complete_inbox, message_inbox_updates, page_entries, participant_profile_operations
+from search import search_index, search_tokens, tokenize, mongo_prefix_query, SEARCH_FIELDS
+from metrics import (
+    registry, MetricsMiddleware, SOCKETIO_CONNECTIONS, SOCKETIO_CONNECTED, SOCKETIO_DISCONNECTS
+)
+from log_config import configure_logging, sampled_logger
+from rate_limit import rate_limiter, load_shedder, rate_limit
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database = mongo.db
+    await ensure_indexes(database)
+    if AI_CACHE_MONGO:
+        await ai_service.cache.attach_db(database)
+    loaded_at = datetime.utcnow()
+    await load_search_index(database)
+    await load_match_index(database)
+    await load_skill_associations(database)
+    index_refresher = asyncio.create_task(refresh_user_indexes_forever(database, loaded_at))
+    message_writer.start(database)
+    load_shedder.start()
+    presence.start()
+    try:
+        yield
+    finally:
+        index_refresher.cancel()
+        await load_shedder.stop()
+        await presence.stop()
+        await rate_limiter.backend.close()
+        await read_receipts.stop()
+        await message_writer.stop()
+        mongo.close()
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create Socket.IO server
-sio = socketio.AsyncServer(
+sio = InstrumentedAsyncServer(
     async_mode='asgi',
+    client_manager=create_client_manager(),
     cors_allowed_origins='*',
-    logger=True,
-    engineio_logger=True
+    logger=sampled_logger('socketio.server'),
+    engineio_logger=sampled_logger('engineio.server')
 )
 
 # Wrap with ASGI app
@@ -55,11 +109,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Per-route latency and in-flight requests, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Configure logging; records are written by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # ============= Helper Functions =============
@@ -78,25 +132,94 @@ def user_to_response(user: dict) -> dict:
         "completedExchanges": user.get("completedExchanges", 0)
     }
 
-async def get_or_create_conversation(user1_id: str, user2_id: str) -> str:
-    # Check if conversation exists
-    conversation = await db.conversations.find_one({
-        "participants": {"$all": [user1_id, user2_id]}
-    })
+async def reserve_message_seq(sender_id: str, receiver_id: str) -> Tuple[str, int]:
+    """Get or create the pair's conversation and take its next message sequence number
+    
+    One atomic upsert on the unique pair key; the $inc makes sequence numbers
+    monotonic per conversation across every worker.
+    """
+    new_conversation = Conversation(participants=[sender_id, receiver_id]).dict()
+    new_conversation.pop("pairKey")
+    new_conversation.pop("lastSeq")
+    query = {"pairKey": conversation_pair_key(sender_id, receiver_id)}
+    update = {"$setOnInsert": new_conversation, "$inc": {"lastSeq": 1}}
+    projection = {"_id": 0, "id": 1, "lastSeq": 1}
+    try:
+        conversation = await db.conversations.find_one_and_update(
+            query, update, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent first message won the insert; increment its conversation
+        conversation = await db.conversations.find_one_and_update(
+            query, {"$inc": {"lastSeq": 1}}, projection=projection, return_document=ReturnDocument.AFTER
+        )
+    return conversation["id"], conversation["lastSeq"]
+
+async def get_current_user_doc(current_user: dict = Depends(get_current_user)) -> dict:
+    # FastAPI resolves a dependency once per request, so handlers share this lookup
+    user = await user_cache.get(db, current_user["id"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+async def get_conversation_for_user(conversation_id: str, user_id: str) -> dict:
+    conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0, "participants": 1})
+    if not conversation or user_id not in conversation["participants"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return conversation
+
+async def mark_conversation_read(conversation_id: str, user_id: str, up_to: datetime) -> int:
+    """Mark messages to `user_id` up to `up_to` as read and clear their inbox unread count"""
+    result = await db.messages.update_many(
+        {
+            "conversationId": conversation_id,
+            "receiverId": user_id,
+            "read": False,
+            "createdAt": {"$lte": up_to}
+        },
+        {"$set": {"read": True}}
+    )
+    await db.inboxes.update_one(
+        {"userId": user_id, f"entries.{conversation_id}": {"$exists": True}},
+        {"$set": {f"entries.{conversation_id}.unreadCount": 0}}
+    )
+    return result.modified_count
+
+async def deliver_message(sender: dict, receiver_id: str, text: str) -> Message:
+    """Emit a message to the receiver and persist it; shared by REST and Socket.IO"""
+    receiver = await user_cache.get(db, receiver_id)
+    if not receiver:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    if conversation:
-        return conversation["id"]
+    # Get or create conversation
+    conversation_id, seq = await reserve_message_seq(sender["id"], receiver_id)
     
-    # Create new conversation
-    new_conversation = Conversation(
-        participants=[user1_id, user2_id]
+    # Create message
+    message = Message(
+        conversationId=conversation_id,
+        senderId=sender["id"],
+        receiverId=receiver_id,
+        message=text,
+        seq=seq
     )
-    await db.conversations.insert_one(new_conversation.dict())
-    return new_conversation.id
+    
+    # Emit to WebSocket right away; persistence is batched by the message writer
+    payload = jsonable_encoder(message.dict())
+    replay_buffer.record(receiver_id, payload)
+    replay_buffer.record(sender["id"], payload)
+    await sio.emit('new_message', payload, room=receiver_id)
+    
+    persisted = await message_writer.submit(
+        message.dict(),
+        {"lastMessage": text, "lastMessageTime": message.createdAt},
+        message_inbox_updates(message.dict(), sender, receiver)
+    )
+    await persisted
+    return message
 
 # ============= Authentication Endpoints =============
 
-@api_router.post("/auth/register")
+@api_router.post("/auth/register", dependencies=[Depends(rate_limit("register"))])
 async def register(user_data: UserCreate):
     # Check if user exists
     existing_user = await db.users.find_one({"email": user_data.email})
@@ -110,11 +233,16 @@ async def register(user_data: UserCreate):
     user = User(
         name=user_data.name,
         email=user_data.email,
-        password=get_password_hash(user_data.password),
+        password=await hash_password_async(user_data.password),
         avatar=f"https://api.dicebear.com/7.x/avataaars/svg?seed={user_data.email}"
     )
+    user.searchTokens = search_tokens(user.dict())
     
     await db.users.insert_one(user.dict())
+    # A new user has no older conversations, so message traffic alone keeps this inbox whole
+    await db.inboxes.update_one({"userId": user.id}, {"$set": {"complete": True}}, upsert=True)
+    match_index.upsert(user.dict())
+    search_index.upsert(user.dict())
     
     # Create access token
     access_token = create_access_token(data={"sub": user.id})
@@ -124,16 +252,27 @@ async def register(user_data: UserCreate):
         "user": user_to_response(user.dict())
     }
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limit("login"))])
 async def login(credentials: UserLogin):
     # Find user
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    
+    valid, new_hash = await verify_password_async(credentials.password, user["password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Transparently upgrade hashes made with an older work factor
+    if new_hash:
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password": new_hash}})
+    
     # Create access token
     access_token = create_access_token(data={"sub": user["id"]})
     
@@ -143,11 +282,7 @@ async def login(credentials: UserLogin):
     }
 
 @api_router.get("/auth/me")
-async def get_me(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["id"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+async def get_me(user: dict = Depends(get_current_user_doc)):
     return {"user": user_to_response(user)}
 
 # ============= User Endpoints =============
@@ -156,25 +291,62 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 async def get_users(
     search: Optional[str] = None,
     skill: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    query = {"id": {"$ne": current_user["id"]}}  # Exclude current user
+    after = decode_rank_cursor(cursor) if cursor else None
     
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"skillsToTeach": {"$regex": search, "$options": "i"}}
-        ]
+    if search and search_index.ready:
+        # Relevance-ranked from the in-memory index, then one batched fetch
+        ranked = search_index.search(
+            search, limit=limit + 1, after=after, skill=skill, exclude=[current_user["id"]]
+        )
+        ids = [user_id for user_id, _ in ranked[:limit]]
+        users = await db.users.find({"id": {"$in": ids}}, USER_RESPONSE_FIELDS).to_list(len(ids))
+        users_by_id = {user["id"]: user for user in users}
+        page = [(users_by_id[uid], score) for uid, score in ranked[:limit] if uid in users_by_id]
+        has_more = len(ranked) > limit
+    else:
+        # Unranked, ordered by id; search falls back to the searchTokens prefix index
+        query = {"id": {"$ne": current_user["id"]}}  # Exclude current user
+        if after:
+            query["id"] = {"$ne": current_user["id"], "$gt": after[1]}
+        
+        if search:
+            terms = tokenize(search)
+            if not terms:
+                return FastJSONResponse({"users": [], "nextCursor": None})
+            query.update(mongo_prefix_query(terms))
+        
+        if skill:
+            query["skillsToTeach"] = skill
+        
+        users = await db.users.find(query, USER_RESPONSE_FIELDS).sort("id", 1).limit(limit + 1).to_list(limit + 1)
+        page = [(user, 0.0) for user in users[:limit]]
+        has_more = len(users) > limit
     
-    if skill:
-        query["skillsToTeach"] = skill
+    next_cursor = None
+    if has_more and page:
+        last_user, last_score = page[-1]
+        next_cursor = encode_rank_cursor(last_score, last_user["id"])
     
-    users = await db.users.find(query).to_list(100)
-    return {"users": [user_to_response(user) for user in users]}
+    return FastJSONResponse({
+        "users": users_to_response([user for user, _ in page]),
+        "nextCursor": next_cursor
+    })
+
+@api_router.get("/users/autocomplete")
+async def autocomplete_users(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    return {"suggestions": search_index.autocomplete(q, limit)}
 
 @api_router.get("/users/{user_id}")
 async def get_user(user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": user_id})
+    user = await user_cache.get(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -183,41 +355,55 @@ async def get_user(user_id: str, current_user: dict = Depends(get_current_user))
 @api_router.put("/users/profile")
 async def update_profile(
     updates: UserUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user_doc)
 ):
     update_data = {k: v for k, v in updates.dict().items() if v is not None}
     update_data["updatedAt"] = datetime.utcnow()
+    if "name" in update_data or "skillsToTeach" in update_data:
+        update_data["searchTokens"] = search_tokens({**current_user, **update_data})
     
-    await db.users.update_one(
+    user = await db.users.find_one_and_update(
         {"id": current_user["id"]},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection=USER_DOC_FIELDS,
+        return_document=ReturnDocument.AFTER
     )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    user = await db.users.find_one({"id": current_user["id"]})
+    user_cache.put(user)
+    match_index.upsert(user)
+    search_index.upsert(user)
+    skill_associations.update(user_skills(current_user), user_skills(user))
+    
+    # Keep the name and avatar shown in other users' inboxes current
+    if "name" in update_data or "avatar" in update_data:
+        conversations = await db.conversations.find(
+            {"participants": user["id"]}, {"_id": 0, "id": 1, "participants": 1}
+        ).to_list(None)
+        operations = participant_profile_operations(user, conversations)
+        if operations:
+            await db.inboxes.bulk_write(operations, ordered=False)
     return {"user": user_to_response(user)}
 
 # ============= AI Endpoints =============
 
-@api_router.post("/ai/match-recommendations")
-async def get_ai_recommendations(current_user: dict = Depends(get_current_user)):
-    # Get current user data
-    user = await db.users.find_one({"id": current_user["id"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get all other users
-    all_users = await db.users.find({"id": {"$ne": current_user["id"]}}).to_list(100)
+@api_router.post("/ai/match-recommendations", dependencies=[Depends(rate_limit("ai"))])
+async def get_ai_recommendations(user: dict = Depends(get_current_user_doc)):
+    # Prefer the nightly precomputed list, else score from the in-memory skill index
+    ranked_ids = await get_precomputed_recommendations(db, user)
+    if ranked_ids is None:
+        match_index.upsert(user)
+        ranked_ids = [user_id for user_id, _ in match_index.recommend(user["id"], limit=3)]
+    ranked_ids = ranked_ids[:3]
     
-    # Get AI recommendations
-    recommendations = await ai_service.get_skill_matches(
-        user.get("skillsToTeach", []),
-        user.get("skillsToLearn", []),
-        all_users
-    )
+    users = await db.users.find({"id": {"$in": ranked_ids}}, USER_RESPONSE_FIELDS).to_list(len(ranked_ids))
+    users_by_id = {u["id"]: u for u in users}
+    recommendations = [users_by_id[uid] for uid in ranked_ids if uid in users_by_id]
     
-    return {"recommendations": [user_to_response(rec) for rec in recommendations]}
+    return FastJSONResponse({"recommendations": users_to_response(recommendations)})
 
-@api_router.post("/ai/enhance-profile")
+@api_router.post("/ai/enhance-profile", dependencies=[Depends(rate_limit("ai"))])
 async def enhance_profile(
     request: AIEnhanceRequest,
     current_user: dict = Depends(get_current_user)
@@ -229,7 +415,7 @@ async def enhance_profile(
     )
     return result
 
-@api_router.post("/ai/chat-assistant")
+@api_router.post("/ai/chat-assistant", dependencies=[Depends(rate_limit("ai"))])
 async def chat_with_assistant(
     request: AIChatRequest,
     current_user: dict = Depends(get_current_user)
@@ -237,103 +423,147 @@ async def chat_with_assistant(
     response = await ai_service.chat_assistant(request.message)
     return {"response": response}
 
+@api_router.post("/ai/chat-assistant/stream", dependencies=[Depends(rate_limit("ai"))])
+async def stream_chat_with_assistant(
+    request: AIChatRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    # Server-Sent Events; Starlette cancels the generator when the client disconnects
+    async def events():
+        async for chunk in ai_service.stream_chat_assistant(request.message):
+            yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/ai/stats")
+async def get_ai_stats(current_user: dict = Depends(get_current_user)):
+    return {"cache": ai_service.cache.stats(), "guard": ai_service.guard.stats()}
+
+@api_router.get("/db/stats")
+async def get_db_stats(current_user: dict = Depends(get_current_user)):
+    return {"pool": mongo.stats()}
+
+# ============= Presence Endpoints =============
+
+@api_router.get("/presence")
+async def get_presence(
+    userIds: str = Query(..., description="Comma-separated user IDs"),
+    current_user: dict = Depends(get_current_user)
+):
+    user_ids = [user_id for user_id in userIds.split(",") if user_id][:200]
+    return {"presence": await presence.online(user_ids)}
+
+@api_router.get("/presence/{user_id}")
+async def get_user_presence(user_id: str, current_user: dict = Depends(get_current_user)):
+    return {
+        "userId": user_id,
+        "online": await presence.is_online(user_id),
+        "connections": await presence.connections(user_id)
+    }
+
 # ============= Message Endpoints =============
 
 @api_router.get("/messages/conversations")
-async def get_conversations(current_user: dict = Depends(get_current_user)):
-    conversations = await db.conversations.find({
-        "participants": current_user["id"]
-    }).to_list(100)
+async def get_conversations(
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    # Newest conversations first, keyset-paginated on (lastMessageTime, id)
+    inbox = await db.inboxes.find_one({"userId": current_user["id"]}, {"_id": 0, "entries": 1, "complete": 1})
+    entries = (inbox or {}).get("entries", {})
+    if not (inbox or {}).get("complete"):
+        # Missing, or created by messages sent since the upgrade: fill in older conversations once
+        entries = await complete_inbox(db, current_user["id"], entries)
     
-    result = []
-    for conv in conversations:
-        other_user_id = [p for p in conv["participants"] if p != current_user["id"]][0]
-        other_user = await db.users.find_one({"id": other_user_id})
-        
-        if other_user:
-            # Get unread count
-            unread_count = await db.messages.count_documents({
-                "conversationId": conv["id"],
-                "receiverId": current_user["id"],
-                "read": False
-            })
-            
-            result.append({
-                "id": conv["id"],
-                "participantId": other_user["id"],
-                "participantName": other_user["name"],
-                "participantAvatar": other_user.get("avatar"),
-                "lastMessage": conv.get("lastMessage", ""),
-                "lastMessageTime": conv.get("lastMessageTime", conv["createdAt"]),
-                "unreadCount": unread_count
-            })
-    
-    return {"conversations": result}
+    after = decode_cursor(cursor) if cursor else None
+    result, has_more = page_entries(entries, limit, after)
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(result[-1]["lastMessageTime"], result[-1]["id"])
+    return FastJSONResponse({"conversations": result, "nextCursor": next_cursor})
 
 @api_router.get("/messages/{conversation_id}")
 async def get_messages(
     conversation_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(get_current_user)
 ):
     # Verify user is part of conversation
-    conversation = await db.conversations.find_one({"id": conversation_id})
-    if not conversation or current_user["id"] not in conversation["participants"]:
-        raise HTTPException(status_code=403, detail="Access denied")
+    await get_conversation_for_user(conversation_id, current_user["id"])
     
-    messages = await db.messages.find({"conversationId": conversation_id}).sort("createdAt", 1).to_list(1000)
+    query = {"conversationId": conversation_id}
+    if after:
+        # Newer messages than the cursor, oldest first
+        query.update(keyset_filter("createdAt", after, older=False))
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("createdAt", 1), ("id", 1)]
+        ).limit(limit).to_list(limit)
+        has_older = True
+    else:
+        # Newest page first (or the page older than `before`), returned oldest first
+        query.update(keyset_filter("createdAt", before, older=True))
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("createdAt", -1), ("id", -1)]
+        ).limit(limit + 1).to_list(limit + 1)
+        has_older = len(messages) > limit
+        messages = messages[:limit][::-1]
     
-    # Mark messages as read
-    await db.messages.update_many(
-        {
-            "conversationId": conversation_id,
-            "receiverId": current_user["id"],
-            "read": False
-        },
-        {"$set": {"read": True}}
-    )
+    # Mark messages as read up to the newest one served, and only if needed
+    if any(m["receiverId"] == current_user["id"] and not m["read"] for m in messages):
+        await mark_conversation_read(conversation_id, current_user["id"], messages[-1]["createdAt"])
+    
+    older_cursor = None
+    newer_cursor = after
+    if messages:
+        if has_older:
+            older_cursor = encode_cursor(messages[0]["createdAt"], messages[0]["id"])
+        newer_cursor = encode_cursor(messages[-1]["createdAt"], messages[-1]["id"])
     
-    return {"messages": messages}
+    return FastJSONResponse({
+        "messages": messages,
+        "olderCursor": older_cursor,
+        "newerCursor": newer_cursor
+    })
 
-@api_router.post("/messages/send")
-async def send_message(
-    message_data: MessageCreate,
+@api_router.get("/messages/{conversation_id}/export")
+async def export_messages(
+    conversation_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    # Get or create conversation
-    conversation_id = await get_or_create_conversation(
-        current_user["id"],
-        message_data.receiverId
-    )
-    
-    # Create message
-    message = Message(
-        conversationId=conversation_id,
-        senderId=current_user["id"],
-        receiverId=message_data.receiverId,
-        message=message_data.message
-    )
+    await get_conversation_for_user(conversation_id, current_user["id"])
     
-    await db.messages.insert_one(message.dict())
+    async def stream_messages():
+        cursor = db.messages.find(
+            {"conversationId": conversation_id}, {"_id": 0}
+        ).sort([("createdAt", 1), ("id", 1)]).batch_size(500)
+        async for message in cursor:
+            yield json.dumps(message, default=str) + "\n"
     
-    # Update conversation
-    await db.conversations.update_one(
-        {"id": conversation_id},
-        {
-            "$set": {
-                "lastMessage": message_data.message,
-                "lastMessageTime": datetime.utcnow()
-            }
-        }
+    return StreamingResponse(
+        stream_messages(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.ndjson"'}
     )
-    
-    # Emit to WebSocket
-    await sio.emit('new_message', message.dict(), room=message_data.receiverId)
-    
+
+@api_router.post("/messages/send")
+async def send_message(
+    message_data: MessageCreate,
+    current_user: dict = Depends(get_current_user_doc)
+):
+    message = await deliver_message(current_user, message_data.receiverId, message_data.message)
     return {"message": message.dict()}
 
 # ============= Contact Endpoint =============
 
-@api_router.post("/contact")
+@api_router.post("/contact", dependencies=[Depends(rate_limit("contact"))])
 async def submit_contact(contact_data: ContactCreate):
     contact = Contact(**contact_data.dict())
     await db.contacts.insert_one(contact.dict())
@@ -345,33 +575,327 @@ async def submit_contact(contact_data: ContactCreate):
 async def root():
     return {"message": "Hello World"}
 
+# ============= Metrics =============
+
+# Stats named in `counters` only ever grow and are exported as Prometheus counters
+registry.add_collector(
+    "mongo_pool", mongo.stats, counters=("checkouts", "checkoutFailures", "slowCheckouts", "poolClears")
+)
+registry.add_collector("ai_cache", ai_service.cache.stats, counters=ai_service.cache.counters)
+registry.add_collector("message_writer", message_writer.stats, counters=message_writer.counters)
+registry.add_collector(
+    "user_cache", lambda: {"hits": user_cache.hits, "misses": user_cache.misses}, counters=("hits", "misses")
+)
+registry.add_collector("skill_associations", skill_associations.stats)
+registry.add_collector("rate_limiter", rate_limiter.stats, counters=rate_limiter.counters)
+registry.add_collector("load_shedder", load_shedder.stats, counters=load_shedder.counters)
+
+# Shed expensive requests before these backlogs grow without bound
+load_shedder.watch_queue("password_hashing", hash_queue_depth, int(os.getenv("LOAD_SHED_MAX_HASH_QUEUE", "64")))
+load_shedder.watch_queue(
+    "message_writer", lambda: message_writer.stats()["queued"], int(os.getenv("LOAD_SHED_MAX_WRITE_QUEUE", "10000"))
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
 # ============= WebSocket Events =============
 
+def socket_token(environ: dict, auth: Optional[dict]) -> str:
+    # Socket.IO auth payload first, then ?token= or an Authorization header
+    if auth and auth.get('token'):
+        return auth['token']
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    if query.get('token'):
+        return query['token'][0]
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    return header[7:] if header.lower().startswith('bearer ') else ''
+
 @sio.event
-async def connect(sid, environ):
-    logger.info(f"Client connected: {sid}")
+async def connect(sid, environ, auth=None):
+    try:
+        user_id = decode_token(socket_token(environ, auth)).get('sub')
+    except HTTPException:
+        user_id = None
+    if not user_id:
+        SOCKETIO_CONNECTIONS.inc(outcome="refused")
+        raise socketio.exceptions.ConnectionRefusedError('authentication failed')
+    
+    SOCKETIO_CONNECTIONS.inc(outcome="accepted")
+    SOCKETIO_CONNECTED.inc()
+    await sio.save_session(sid, {'userId': user_id})
+    await sio.enter_room(sid, user_id)
+    if await presence.add(user_id, sid):
+        await sio.emit('presence_changed', {'userId': user_id, 'online': True}, room=presence_room(user_id))
+    logger.info(f"Client connected: {sid} (user {user_id})")
 
 @sio.event
 async def disconnect(sid):
+    SOCKETIO_DISCONNECTS.inc()
+    SOCKETIO_CONNECTED.dec()
+    typing_throttle.forget(sid)
+    for task in assistant_tasks.pop(sid, {}).values():
+        task.cancel()
+    user_id, went_offline = await presence.remove(sid)
+    if went_offline:
+        await sio.emit('presence_changed', {'userId': user_id, 'online': False}, room=presence_room(user_id))
     logger.info(f"Client disconnected: {sid}")
 
+def acked(handler):
+    """Ack a failing Socket.IO handler with a 500, as the REST API would, instead of leaving the client waiting"""
+    
+    @functools.wraps(handler)
+    async def wrapper(sid, *args):
+        try:
+            return await handler(sid, *args)
+        except Exception:
+            logger.exception(f"Socket.IO handler {handler.__name__} failed")
+            return {'error': 'Internal server error', 'status': 500}
+    
+    return wrapper
+
+def invalid_payload() -> dict:
+    return {'error': 'Invalid payload', 'status': 422}
+
+def user_id_list(data) -> Optional[List[str]]:
+    """data["userIds"] when it is a list of strings, else None"""
+    user_ids = data.get('userIds') if isinstance(data, dict) else None
+    if not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids):
+        return None
+    return user_ids
+
 @sio.event
-async def join(sid, data):
-    user_id = data.get('userId')
-    if user_id:
-        await sio.enter_room(sid, user_id)
-        logger.info(f"User {user_id} joined room")
+@acked
+async def join(sid, data=None):
+    # Rooms are joined on connect; kept so older clients calling join still work
+    user_id = presence.user_for(sid)
+    return {'userId': user_id}
 
 @sio.event
-async def leave(sid, data):
-    user_id = data.get('userId')
-    if user_id:
+async def leave(sid, data=None):
+    if not isinstance(data, dict):
+        return invalid_payload()
+    user_id = presence.user_for(sid)
+    if user_id and data.get('userId') == user_id:
         await sio.leave_room(sid, user_id)
         logger.info(f"User {user_id} left room")
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+@sio.event
+@acked
+async def watch_presence(sid, data=None):
+    user_ids = user_id_list(data)
+    if user_ids is None:
+        return invalid_payload()
+    user_ids = user_ids[:200]
+    for user_id in user_ids:
+        await sio.enter_room(sid, presence_room(user_id))
+    return {'presence': await presence.online(user_ids)}
+
+@sio.event
+async def unwatch_presence(sid, data=None):
+    user_ids = user_id_list(data)
+    if user_ids is None:
+        return invalid_payload()
+    for user_id in user_ids:
+        await sio.leave_room(sid, presence_room(user_id))
+
+# In-flight assistant generations per socket, cancelled on disconnect
+assistant_tasks: Dict[str, Dict[str, asyncio.Task]] = {}
+
+async def stream_assistant_to_socket(sid: str, request_id: str, message: str):
+    async for chunk in ai_service.stream_chat_assistant(message):
+        await sio.emit('assistant_chunk', {"requestId": request_id, "chunk": chunk}, to=sid)
+    await sio.emit('assistant_done', {"requestId": request_id}, to=sid)
+
+@sio.event
+@acked
+async def assistant_message(sid, data=None):
+    if not isinstance(data, dict):
+        return invalid_payload()
+    retry_after = load_shedder.admit() or await rate_limiter.check("ai", user_id=presence.user_for(sid))
+    if retry_after:
+        return {"error": "Too many requests", "status": 429, "retryAfter": math.ceil(retry_after)}
+    request_id = data.get('requestId') or str(uuid.uuid4())
+    task = asyncio.create_task(stream_assistant_to_socket(sid, request_id, data.get('message', '')))
+    assistant_tasks.setdefault(sid, {})[request_id] = task
+    task.add_done_callback(lambda _: assistant_tasks.get(sid, {}).pop(request_id, None))
+    return {"requestId": request_id}
+
+@sio.event
+async def assistant_cancel(sid, data=None):
+    if not isinstance(data, dict):
+        return invalid_payload()
+    task = assistant_tasks.get(sid, {}).get(data.get('requestId'))
+    if task:
+        task.cancel()
+
+# Chat over the socket: the connection was authenticated once in connect()
+async def flush_read_receipt(user_id: str, conversation_id: str, up_to: datetime):
+    try:
+        conversation = await get_conversation_for_user(conversation_id, user_id)
+    except HTTPException:
+        return
+    if await mark_conversation_read(conversation_id, user_id, up_to):
+        receipt = {'conversationId': conversation_id, 'readerId': user_id, 'upTo': up_to.isoformat()}
+        for other_id in conversation["participants"]:
+            if other_id != user_id:
+                await sio.emit('messages_read', receipt, room=other_id)
+
+read_receipts = ReadReceiptCoalescer(flush_read_receipt)
+RESUME_MAX_CONVERSATIONS = int(os.getenv("RESUME_MAX_CONVERSATIONS", "200"))
+RESUME_MAX_MESSAGES = int(os.getenv("RESUME_MAX_MESSAGES", "500"))
+typing_throttle = TypingThrottle()
+registry.add_collector("read_receipts", read_receipts.stats, counters=read_receipts.counters)
+registry.add_collector("replay_buffer", replay_buffer.stats, counters=replay_buffer.counters)
+
+@sio.on('send_message')
+@acked
+async def socket_send_message(sid, data=None):
+    """Ack with the stored message, or {"error", "status"} like the REST endpoint would return"""
+    try:
+        payload = MessageCreate(**data)
+    except (TypeError, ValidationError):
+        return {'error': 'Invalid message', 'status': 422}
+    sender = await user_cache.get(db, presence.user_for(sid))
+    if not sender:
+        return {'error': 'User not found', 'status': 404}
+    
+    typing_throttle.clear(sid, payload.receiverId)
+    try:
+        message = await deliver_message(sender, payload.receiverId, payload.message)
+    except HTTPException as e:
+        return {'error': e.detail, 'status': e.status_code}
+    return {
+        'id': message.id,
+        'conversationId': message.conversationId,
+        'createdAt': message.createdAt.isoformat(),
+        'clientId': data.get('clientId')
+    }
+
+@sio.on('typing')
+async def typing_indicator(sid, data=None):
+    if not isinstance(data, dict):
+        return invalid_payload()
+    receiver_id = data.get('receiverId')
+    is_typing = bool(data.get('typing', True))
+    if receiver_id and typing_throttle.should_forward(sid, receiver_id, is_typing):
+        await sio.emit('typing', {
+            'userId': presence.user_for(sid),
+            'conversationId': data.get('conversationId'),
+            'typing': is_typing
+        }, room=receiver_id)
+
+@sio.on('mark_read')
+@acked
+async def mark_read(sid, data=None):
+    if not isinstance(data, dict):
+        return invalid_payload()
+    conversation_id = data.get('conversationId')
+    if not conversation_id:
+        return {'error': 'conversationId is required', 'status': 422}
+    try:
+        up_to = datetime.fromisoformat(data['upTo']) if data.get('upTo') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return {'error': 'Invalid upTo', 'status': 422}
+    if up_to.tzinfo:
+        up_to = up_to.astimezone(timezone.utc).replace(tzinfo=None)
+    read_receipts.mark(presence.user_for(sid), conversation_id, up_to)
+    return {'ok': True}
+
+@sio.on('resume')
+@acked
+async def resume(sid, data=None):
+    """Replay what a reconnecting client missed: {"lastSeq": {conversationId: seq}}
+    
+    Served from the in-memory replay buffer when it holds the whole gap, otherwise
+    with an indexed (conversationId, seq) range query capped at RESUME_MAX_MESSAGES.
+    The returned lastSeq is the highest seq delivered without a hole before it.
+    """
+    try:
+        request = ResumeRequest(**data)
+    except (TypeError, ValidationError):
+        return {'error': 'Invalid resume request', 'status': 422}
+    user_id = presence.user_for(sid)
+    last_seen = dict(list(request.lastSeq.items())[:RESUME_MAX_CONVERSATIONS])
+    conversations = await db.conversations.find(
+        {"id": {"$in": list(last_seen)}, "participants": user_id},
+        {"_id": 0, "id": 1, "lastSeq": 1}
+    ).to_list(None)
+    
+    replayed, truncated, from_db = [], [], 0
+    delivered = {}
+    for conv in conversations:
+        after, latest = last_seen[conv["id"]], conv.get("lastSeq", 0)
+        delivered[conv["id"]] = after
+        if after >= latest:
+            continue
+        gap = replay_buffer.gap(user_id, conv["id"], after, latest)
+        if gap is None:
+            stored = await db.messages.find(
+                {"conversationId": conv["id"], "seq": {"$gt": after}}, {"_id": 0}
+            ).sort("seq", 1).limit(RESUME_MAX_MESSAGES).to_list(RESUME_MAX_MESSAGES)
+            gap, delivered[conv["id"]] = contiguous(after, stored)
+            gap = jsonable_encoder(gap)
+            from_db += 1
+        else:
+            delivered[conv["id"]] = latest
+        if delivered[conv["id"]] < latest:
+            # Capped, or stopped before a message still being written: resume again later
+            truncated.append(conv["id"])
+        replayed.extend(gap)
+    
+    return {
+        'messages': replayed,
+        'lastSeq': delivered,
+        'truncated': truncated,
+        'fromDatabase': from_db
+    }
+
+async def load_search_index(database):
+    search_index.load(await database.users.find({}, SEARCH_FIELDS).to_list(None))
+    search_index.ready = True
+    logger.info(f"Search index loaded with {len(search_index)} users")
+
+async def load_match_index(database):
+    async for user in database.users.find({}, MATCH_FIELDS):
+        match_index.upsert(user)
+    logger.info(f"Skill match index loaded with {len(match_index)} users")
+
+async def load_skill_associations(database):
+    # Prefer the batch-built snapshot; otherwise count from the match index already in memory
+    if not await skill_associations.load(database):
+        skill_associations.build(profile["teach"] | profile["learn"] for profile in match_index.profiles.values())
+    logger.info(f"Skill associations loaded with {len(skill_associations)} skills")
+
+# Profile writes made through other workers reach this worker's indexes within this many seconds (0 disables)
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "5"))
+# Writes this much older than the newest seen are read again, in case they landed out of order
+INDEX_REFRESH_OVERLAP = float(os.getenv("INDEX_REFRESH_OVERLAP", "10"))
+INDEX_REFRESH_FIELDS = {**MATCH_FIELDS, **SEARCH_FIELDS, "updatedAt": 1}
+
+async def refresh_user_indexes(database, since: datetime) -> datetime:
+    """Apply users updated since `since`, by any worker, to this worker's indexes; returns the new watermark"""
+    newest = since
+    query = {"updatedAt": {"$gte": since - timedelta(seconds=INDEX_REFRESH_OVERLAP)}}
+    async for user in database.users.find(query, INDEX_REFRESH_FIELDS):
+        indexed = match_index.profiles.get(user["id"])
+        skill_associations.update(indexed["teach"] | indexed["learn"] if indexed else set(), user_skills(user))
+        match_index.upsert(user)
+        search_index.upsert(user)
+        user_cache.invalidate(user["id"])
+        newest = max(newest, user["updatedAt"])
+    return newest
+
+async def refresh_user_indexes_forever(database, since: datetime):
+    if INDEX_REFRESH_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(INDEX_REFRESH_INTERVAL)
+        try:
+            since = await refresh_user_indexes(database, since)
+        except Exception as e:
+            logger.warning(f"Refreshing user indexes failed: {e}")
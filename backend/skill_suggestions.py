@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import heapq
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from pymongo import ReplaceOne
+from database import mongo
+from matching import normalize_skills
+
+SKILL_MIN_SUPPORT = int(os.getenv("SKILL_MIN_SUPPORT", "5"))
+SKILL_NEIGHBORS = int(os.getenv("SKILL_NEIGHBORS", "50"))
+SKILL_NEIGHBORS_TTL = float(os.getenv("SKILL_NEIGHBORS_TTL", "300"))
+
+# Only the fields needed to build the model; use as a Mongo projection
+SKILL_FIELDS = {"_id": 0, "skillsToTeach": 1, "skillsToLearn": 1}
+
+def user_skills(user: dict) -> Set[str]:
+    """A user's basket: everything they teach or want to learn, normalized"""
+    return normalize_skills(user.get("skillsToTeach")) | normalize_skills(user.get("skillsToLearn"))
+
+def cooccurrence_arrays(baskets: Iterable[Iterable[str]]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    """Count skills and skill pairs over all baskets as a sparse upper-triangular matrix
+    
+    Returns (vocabulary, per-skill user counts, pair rows, pair columns, pair counts,
+    user count); pairs are generated a diagonal at a time over the flattened baskets,
+    so memory is one int64 per co-occurring pair rather than vocabulary squared.
+    """
+    vocabulary: Dict[str, int] = {}
+    indices: List[int] = []
+    lengths: List[int] = []
+    for basket in baskets:
+        ids = sorted({vocabulary.setdefault(skill, len(vocabulary)) for skill in basket})
+        indices.extend(ids)
+        lengths.append(len(ids))
+    
+    size = max(len(vocabulary), 1)
+    flat = np.array(indices, dtype=np.int64)
+    sizes = np.array(lengths, dtype=np.int64)
+    skill_counts = np.bincount(flat, minlength=size)
+    
+    # Items left after each position within its own basket
+    starts = np.cumsum(sizes) - sizes
+    remaining = np.repeat(sizes, sizes) - (np.arange(len(flat)) - np.repeat(starts, sizes)) - 1
+    keys = []
+    for offset in range(1, int(sizes.max(initial=0))):
+        positions = np.flatnonzero(remaining >= offset)
+        keys.append(flat[positions] * size + flat[positions + offset])
+    keys, pair_counts = np.unique(np.concatenate(keys) if keys else np.empty(0, np.int64), return_counts=True)
+    
+    names = [""] * len(vocabulary)
+    for skill, index in vocabulary.items():
+        names[index] = skill
+    return names, skill_counts, keys // size, keys % size, pair_counts, int(np.count_nonzero(sizes))
+
+class SkillAssociations:
+    """In-memory skill co-occurrence counts with PMI-ranked related skills
+    
+    Counts are built in bulk (from the stored snapshot or the users collection) and
+    then kept current with `update` on every profile change. Each skill's neighbor
+    list is ranked lazily and reused until the skill changes or SKILL_NEIGHBORS_TTL
+    passes, so `suggest` only merges a few short precomputed lists.
+    """
+    
+    def __init__(
+        self,
+        min_support: int = SKILL_MIN_SUPPORT,
+        neighbors: int = SKILL_NEIGHBORS,
+        ttl: float = SKILL_NEIGHBORS_TTL,
+    ):
+        self.min_support = min_support
+        self.neighbor_count = neighbors
+        self.ttl = ttl
+        self.users = 0
+        self.skill_users: Dict[str, int] = {}
+        self.cooccurs: Dict[str, Dict[str, int]] = {}
+        self.ranked: Dict[str, Tuple[float, List[Tuple[str, float]]]] = {}
+        self.popular: Tuple[float, List[str]] = (0.0, [])
+    
+    def __len__(self) -> int:
+        return len(self.skill_users)
+    
+    def build(self, baskets: Iterable[Iterable[str]]):
+        """Replace all counts with those of `baskets`"""
+        names, skill_counts, rows, cols, pair_counts, users = cooccurrence_arrays(baskets)
+        cooccurs: Dict[str, Dict[str, int]] = {name: {} for name in names}
+        for row, col, count in zip(rows.tolist(), cols.tolist(), pair_counts.tolist()):
+            cooccurs[names[row]][names[col]] = count
+            cooccurs[names[col]][names[row]] = count
+        self._replace(users, dict(zip(names, skill_counts.tolist())), cooccurs)
+    
+    def _replace(self, users: int, skill_users: Dict[str, int], cooccurs: Dict[str, Dict[str, int]]):
+        self.users = users
+        self.skill_users = skill_users
+        self.cooccurs = cooccurs
+        self.ranked = {}
+        self.popular = (0.0, [])
+    
+    def most_popular(self) -> List[str]:
+        now = time.monotonic()
+        ranked_at, popular = self.popular
+        if not popular or now - ranked_at >= self.ttl:
+            popular = heapq.nlargest(self.neighbor_count, self.skill_users, key=self.skill_users.get)
+            self.popular = (now, popular)
+        return popular
+    
+    def update(self, old_skills: Set[str], new_skills: Set[str]):
+        """Move one user's basket from `old_skills` to `new_skills` (either may be empty)"""
+        if old_skills == new_skills:
+            return
+        self._count(old_skills, -1)
+        self._count(new_skills, 1)
+        for skill in old_skills ^ new_skills:
+            self.ranked.pop(skill, None)
+    
+    def _count(self, skills: Set[str], delta: int):
+        if not skills:
+            return
+        self.users += delta
+        for skill in skills:
+            count = self.skill_users.get(skill, 0) + delta
+            if count > 0:
+                self.skill_users[skill] = count
+            else:
+                self.skill_users.pop(skill, None)
+            partners = self.cooccurs.setdefault(skill, {})
+            for other in skills:
+                if other == skill:
+                    continue
+                count = partners.get(other, 0) + delta
+                if count > 0:
+                    partners[other] = count
+                else:
+                    partners.pop(other, None)
+            if not partners:
+                del self.cooccurs[skill]
+    
+    def pmi(self, a: str, b: str) -> float:
+        """log(P(a, b) / (P(a) * P(b))) over users; 0 when the pair is below min_support"""
+        together = self.cooccurs.get(a, {}).get(b, 0)
+        if together < self.min_support:
+            return 0.0
+        return math.log(together * self.users / (self.skill_users[a] * self.skill_users[b]))
+    
+    def neighbors(self, skill: str) -> List[Tuple[str, float]]:
+        """Skills most associated with `skill` by positive PMI, best first"""
+        now = time.monotonic()
+        cached = self.ranked.get(skill)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+    
+        scored = ((other, self.pmi(skill, other)) for other in self.cooccurs.get(skill, {}))
+        ranked = heapq.nlargest(
+            self.neighbor_count, (item for item in scored if item[1] > 0), key=lambda item: item[1]
+        )
+        self.ranked[skill] = (now, ranked)
+        return ranked
+    
+    def suggest(self, skills: Iterable[str], limit: int = 5) -> List[str]:
+        """Skills to add to a profile holding `skills`, by summed PMI; popular skills fill any gap"""
+        own = normalize_skills(skills)
+        scores: Dict[str, float] = {}
+        for skill in own:
+            for other, score in self.neighbors(skill):
+                if other not in own:
+                    scores[other] = scores.get(other, 0.0) + score
+    
+        suggested = heapq.nlargest(limit, scores, key=scores.get)
+        for skill in self.most_popular():
+            if len(suggested) >= limit:
+                break
+            if skill not in own and skill not in scores:
+                suggested.append(skill)
+        return suggested
+    
+    def stats(self) -> dict:
+        return {
+            "users": self.users,
+            "skills": len(self.skill_users),
+            "pairs": sum(len(partners) for partners in self.cooccurs.values()) // 2,
+            "rankedSkills": len(self.ranked),
+        }
+    
+    async def load(self, db) -> bool:
+        """Load the snapshot written by `store`; False when there is none yet"""
+        users, skill_users, cooccurs = 0, {}, {}
+        async for doc in db.skill_cooccurrence.find({}, {"_id": 0}):
+            users = doc["totalUsers"]
+            skill_users[doc["skill"]] = doc["users"]
+            cooccurs[doc["skill"]] = dict(doc["cooccurs"])
+        if not skill_users:
+            return False
+        self._replace(users, skill_users, cooccurs)
+        return True
+    
+    async def store(self, db, batch_size: int = 1000) -> int:
+        """Write one document per skill to db.skill_cooccurrence and drop skills no user has any more"""
+        computed_at = datetime.utcnow()
+        operations = []
+        for skill, count in self.skill_users.items():
+            operations.append(ReplaceOne(
+                {"skill": skill},
+                {
+                    "skill": skill,
+                    "users": count,
+                    "cooccurs": [[other, together] for other, together in self.cooccurs.get(skill, {}).items()],
+                    "totalUsers": self.users,
+                    "computedAt": computed_at
+                },
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                await db.skill_cooccurrence.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await db.skill_cooccurrence.bulk_write(operations, ordered=False)
+        await db.skill_cooccurrence.delete_many({"computedAt": {"$lt": computed_at}})
+        return len(self.skill_users)
+
+skill_associations = SkillAssociations()
+
+async def build_from_users(db, model: Optional[SkillAssociations] = None) -> SkillAssociations:
+    """Rebuild `model` from every user's skills"""
+    model = model or skill_associations
+    users = await db.users.find({}, SKILL_FIELDS).to_list(None)
+    model.build(user_skills(user) for user in users)
+    return model
+
+async def main():
+    db = mongo.db
+    
+    started = time.perf_counter()
+    model = await build_from_users(db)
+    stored = await model.store(db)
+    print(f"✓ Built skill co-occurrence for {model.users} users in {time.perf_counter() - started:.1f}s "
+          f"({stored} skills, {model.stats()['pairs']} pairs)")
+    
+    mongo.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the skill co-occurrence snapshot used for suggestedSkills")
+    parser.parse_args()
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import os
+from typing import Optional
+from cachetools import TTLCache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Seconds a user document may be served from process memory; 0 disables the process tier
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "0"))
+
+# Projection for user documents served to handlers: no password hash, no search tokens
+USER_DOC_FIELDS = {"_id": 0, "password": 0, "searchTokens": 0}
+
+class UserCache:
+    """Process-wide cache of user documents, invalidated on profile writes"""
+    
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.enabled = ttl > 0
+        self.users = TTLCache(maxsize=maxsize, ttl=ttl) if self.enabled else None
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, db, user_id: str) -> Optional[dict]:
+        if self.enabled and user_id in self.users:
+            self.hits += 1
+            return self.users[user_id]
+        
+        self.misses += 1
+        user = await db.users.find_one({"id": user_id}, USER_DOC_FIELDS)
+        if user and self.enabled:
+            self.users[user_id] = user
+        return user
+    
+    def put(self, user: dict):
+        if self.enabled:
+            self.users[user["id"]] = user
+    
+    def invalidate(self, user_id: str):
+        if self.enabled:
+            self.users.pop(user_id, None)
+
+user_cache = UserCache()
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from pymongo import ReplaceOne
+from database import mongo
+from matching import MATCH_FIELDS, SkillMatchIndex, match_index, normalize_skills
+
+# Memory for the per-block score arrays of top_k_all, which sets how many rows go in a block
+MATCH_BLOCK_BUDGET_MB = float(os.getenv("MATCH_BLOCK_BUDGET_MB", "256"))
+# Block-sized float32 arrays alive at once: gets, gives, scores, their temporaries and argpartition's output
+BLOCK_ARRAYS = 8
+
+class SkillMatrix:
+    """Bit-packed skill vectors for vectorized reciprocal-match scoring"""
+    
+    def __init__(self, users: Iterable[dict], weights: SkillMatchIndex = match_index):
+        self.weights = weights
+        users = list(users)
+        self.user_ids: List[str] = [user["id"] for user in users]
+        self.rows: Dict[str, int] = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        
+        teach = [normalize_skills(user.get("skillsToTeach")) for user in users]
+        learn = [normalize_skills(user.get("skillsToLearn")) for user in users]
+        self.vocabulary: Dict[str, int] = {}
+        for skills in teach + learn:
+            for skill in skills:
+                self.vocabulary.setdefault(skill, len(self.vocabulary))
+        
+        self.teach = self._pack(teach)
+        self.learn = self._pack(learn)
+        
+        locations: Dict[str, int] = {"": 0}
+        self.locations = np.array(
+            [locations.setdefault((u.get("location") or "").strip().lower(), len(locations)) for u in users],
+            dtype=np.int32
+        )
+        ratings = np.array([u.get("rating") or 0.0 for u in users], dtype=np.float32)
+        exchanges = np.array([u.get("completedExchanges") or 0 for u in users], dtype=np.float32)
+        self.reputation = (
+            weights.rating_weight * ratings / 5.0 + weights.exchanges_weight * np.log1p(exchanges)
+        ).astype(np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.user_ids)
+    
+    def _pack(self, skill_sets: List[set]) -> np.ndarray:
+        dense = np.zeros((len(skill_sets), max(len(self.vocabulary), 1)), dtype=bool)
+        for row, skills in enumerate(skill_sets):
+            dense[row, [self.vocabulary[s] for s in skills]] = True
+        return np.packbits(dense, axis=1)
+    
+    def _combine(self, gets: np.ndarray, gives: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        w = self.weights
+        scores = w.learn_weight * gets + w.teach_weight * gives
+        scores += w.reciprocal_weight * np.minimum(gets, gives)
+        scores += self.reputation
+        own_location = self.locations[rows][:, None]
+        scores += w.location_weight * ((self.locations == own_location) & (own_location != 0))
+        return scores
+    
+    def score_one(self, row: int) -> np.ndarray:
+        """Scores of every user as a match for the user at `row`"""
+        gets = np.bitwise_count(self.learn[row] & self.teach).sum(axis=1, dtype=np.float32)
+        gives = np.bitwise_count(self.teach[row] & self.learn).sum(axis=1, dtype=np.float32)
+        return self._combine(gets[None, :], gives[None, :], np.array([row]))[0]
+    
+    def top_k_one(self, user_id: str, k: int = 3) -> List[Tuple[str, float]]:
+        row = self.rows[user_id]
+        scores = self.score_one(row)
+        scores[row] = -np.inf
+        return self._top_k(scores[None, :], k)[0]
+    
+    def block_size(self, budget_mb: float = MATCH_BLOCK_BUDGET_MB) -> int:
+        """Rows per top_k_all block whose score arrays fit in `budget_mb`"""
+        row_bytes = max(len(self), 1) * 4 * BLOCK_ARRAYS
+        return max(1, int(budget_mb * 1024 * 1024) // row_bytes)
+    
+    def top_k_all(self, k: int = 10, block_size: Optional[int] = None) -> Iterable[Tuple[str, List[Tuple[str, float]]]]:
+        """Yield (user_id, top-k matches) for every user, one block of rows at a time
+        
+        Skill vectors are unpacked to float32 once so each block is two BLAS
+        matmuls; memory is 2 * n * vocabulary * 4 bytes plus about
+        MATCH_BLOCK_BUDGET_MB for the blocks, unless block_size is given.
+        """
+        block_size = block_size or self.block_size()
+        n_skills = len(self.vocabulary)
+        teach = np.unpackbits(self.teach, axis=1, count=n_skills).astype(np.float32)
+        learn = np.unpackbits(self.learn, axis=1, count=n_skills).astype(np.float32)
+        
+        for start in range(0, len(self), block_size):
+            rows = np.arange(start, min(start + block_size, len(self)))
+            gets = learn[rows] @ teach.T
+            gives = teach[rows] @ learn.T
+            scores = self._combine(gets, gives, rows)
+            scores[np.arange(len(rows)), rows] = -np.inf
+            for row, matches in zip(rows, self._top_k(scores, k)):
+                yield self.user_ids[row], matches
+    
+    def _top_k(self, scores: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        k = min(k, scores.shape[1] - 1)
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row_scores[candidates])]
+            results.append([(self.user_ids[c], float(row_scores[c])) for c in ordered])
+        return results
+
+async def precompute_recommendations(db, k: int = 10, batch_size: int = 1000) -> int:
+    """Score all users against all users and store top-k lists in db.match_recommendations"""
+    users = await db.users.find({}, MATCH_FIELDS).to_list(None)
+    matrix = SkillMatrix(users)
+    computed_at = datetime.utcnow()
+    
+    operations = []
+    written = 0
+    for user_id, matches in matrix.top_k_all(k):
+        operations.append(ReplaceOne(
+            {"userId": user_id},
+            {
+                "userId": user_id,
+                "recommendations": [match_id for match_id, _ in matches],
+                "scores": [score for _, score in matches],
+                "computedAt": computed_at
+            },
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            await db.match_recommendations.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        await db.match_recommendations.bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
+
+async def get_precomputed_recommendations(db, user: dict) -> Optional[List[str]]:
+    """Precomputed match IDs for `user`, or None if missing or older than their profile"""
+    doc = await db.match_recommendations.find_one({"userId": user["id"]})
+    if not doc:
+        return None
+    updated_at = user.get("updatedAt")
+    if updated_at and updated_at > doc["computedAt"]:
+        return None
+    return doc["recommendations"]
+
+async def main(k: int):
+    db = mongo.db
+    
+    written = await precompute_recommendations(db, k)
+    print(f"✓ Stored top-{k} recommendations for {written} users")
+    
+    mongo.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute skill-swap recommendations for every user")
+    parser.add_argument("--k", type=int, default=10, help="recommendations stored per user")
+    args = parser.parse_args()
+    asyncio.run(main(args.k))